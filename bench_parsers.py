@@ -0,0 +1,42 @@
+"""Benchmarks the BeautifulSoup and direct lxml parser backends on saved product pages.
+
+Save a few product pages from each site (e.g. with "Save Page As... > HTML only")
+and run:
+
+    python bench_parsers.py amazon.in saved/amazon_*.html -n 20
+
+Both backends run the domain's registered selectors; the script prints the average
+parse time per page and whether both backends extracted the same title and price.
+"""
+import argparse
+import time
+from extractors import get_extractor
+
+def bench(extractor, content, backend, rounds):
+    """Returns (average seconds per parse, (title, price)) for one backend."""
+    result = extractor.extract(content, backend=backend)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        extractor.extract(content, backend=backend)
+    return (time.perf_counter() - started) / rounds, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('domain', help="site whose extractor to use, e.g. amazon.in")
+    parser.add_argument('pages', nargs='+', help="saved HTML fixture pages")
+    parser.add_argument('-n', '--rounds', type=int, default=10, help="parses per page and backend")
+    args = parser.parse_args()
+
+    extractor = get_extractor(f"https://www.{args.domain}/")
+    print(f"{type(extractor).__name__} (configured backend: {extractor.backend})")
+    for path in args.pages:
+        with open(path, 'rb') as f:
+            content = f.read()
+        soup_time, soup_result = bench(extractor, content, 'soup', args.rounds)
+        lxml_time, lxml_result = bench(extractor, content, 'lxml', args.rounds)
+        match = "same result" if soup_result == lxml_result else f"DIFFERENT: soup={soup_result} lxml={lxml_result}"
+        print(f"{path} ({len(content) / 1024:.0f} KB): soup {soup_time * 1000:.1f} ms, "
+              f"lxml {lxml_time * 1000:.1f} ms ({soup_time / lxml_time:.1f}x), {match}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import re
+from collections import namedtuple
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+# A stable identity for a product, independent of how its link was shared
+CanonicalProduct = namedtuple('CanonicalProduct', ['key', 'url'])
+
+# Redirecting share links that must be resolved over HTTP before they can be canonicalized
+SHORT_LINK_HOSTS = ('amzn.to', 'amzn.in', 'amzn.eu', 'a.co', 'fkrt.it', 'fkrt.cc', 'myntr.it')
+
+AMAZON_ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d|gp/offer-listing|exec/obidos/ASIN|o/ASIN)/([A-Z0-9]{10})(?:[/?]|$)', re.I)
+FLIPKART_ITEM_RE = re.compile(r'/p/(itm[0-9a-z]+)', re.I)
+MYNTRA_STYLE_RE = re.compile(r'/(\d{5,})(?:/buy)?/?$')
+AMP_CACHE_RE = re.compile(r'^/[a-z]/(?:s/)?(.+)$')
+
+def _host(parsed):
+    """Returns the lowercased host without a leading 'www.' or mobile 'm.' prefix."""
+    host = parsed.netloc.lower().split(':')[0]
+    for prefix in ('www.', 'm.', 'dl.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+def is_short_link(url):
+    """Checks whether a URL is a retailer share link that redirects to the real product page."""
+    parsed = urlparse(url)
+    host = parsed.netloc.lower().split(':')[0]
+    return host in SHORT_LINK_HOSTS or (host == 'dl.flipkart.com' and parsed.path.startswith('/s/'))
+
+def _unwrap_amp(parsed):
+    """Turns a Google AMP cache URL back into the publisher URL it wraps."""
+    if not parsed.netloc.endswith('.ampproject.org'):
+        return parsed
+    match = AMP_CACHE_RE.match(parsed.path)
+    if not match:
+        return parsed
+    return urlparse(f"https://{match.group(1)}{'?' + parsed.query if parsed.query else ''}")
+
+def canonicalize(url):
+    """Maps any variant of a product link to a stable (key, url) pair.
+
+    Amazon links are keyed by ASIN, Flipkart by the `pid` query parameter (or the
+    item id when pid is missing) and Myntra by style id. Links from other sites fall
+    back to the URL with its query string and fragment removed.
+    """
+    parsed = _unwrap_amp(urlparse(url.strip()))
+    host = _host(parsed)
+    path = parsed.path
+
+    if host.startswith('amazon.'):
+        match = AMAZON_ASIN_RE.search(path)
+        if match:
+            asin = match.group(1).upper()
+            return CanonicalProduct(f"{host}:{asin}", f"https://www.{host}/dp/{asin}")
+
+    elif host == 'flipkart.com':
+        if path.startswith('/dl/'):
+            path = path[len('/dl'):]
+        pid = parse_qs(parsed.query).get('pid', [None])[0]
+        item = FLIPKART_ITEM_RE.search(path)
+        if pid or item:
+            # Keep the slug and item path; Flipkart needs them to render the page
+            query = urlencode({'pid': pid}) if pid else ''
+            clean_path = path[:item.end()] if item else path
+            key = pid.upper() if pid else item.group(1).lower()
+            return CanonicalProduct(f"{host}:{key}", urlunparse(('https', f"www.{host}", clean_path, '', query, '')))
+
+    elif host == 'myntra.com':
+        match = MYNTRA_STYLE_RE.search(path)
+        if match:
+            style_id = match.group(1)
+            return CanonicalProduct(f"{host}:{style_id}", f"https://www.{host}/{style_id}")
+
+    clean_url = urlunparse((parsed.scheme or 'https', parsed.netloc.lower(), path.rstrip('/') or '/', '', '', ''))
+    return CanonicalProduct(clean_url, clean_url)
+
+def product_key(url):
+    """Shortcut for the stable product key of a URL."""
+    return canonicalize(url).key
@@ -0,0 +1,89 @@
+import io
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from PIL import Image, ImageDraw, ImageFont
+from config import CHART_CACHE_SIZE
+
+WIDTH, HEIGHT = 800, 400
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 80, 20, 40, 40
+BACKGROUND = (255, 255, 255)
+GRID = (225, 225, 225)
+LINE = (33, 111, 219)
+TEXT = (60, 60, 60)
+
+class ChartCache:
+    """Thread-safe LRU cache of rendered chart PNGs."""
+
+    def __init__(self, max_size=CHART_CACHE_SIZE):
+        self.max_size = max_size
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_size:
+                self._images.popitem(last=False)
+
+def render_price_chart(title, points, until):
+    """Renders (epoch_ts, price) points as a step chart ending at `until` and returns PNG bytes.
+
+    Prices hold until the next observation, so each point extends flat to the next one.
+    """
+    image = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    draw.text((MARGIN_LEFT, 12), title[:90], fill=TEXT, font=font)
+    left, right = MARGIN_LEFT, WIDTH - MARGIN_RIGHT
+    top, bottom = MARGIN_TOP, HEIGHT - MARGIN_BOTTOM
+
+    if not points:
+        draw.text((left, (top + bottom) // 2), "No price history yet.", fill=TEXT, font=font)
+        return _to_png(image)
+
+    start = points[0][0]
+    end = max(until, start + 1)
+    prices = [price for _, price in points]
+    low, high = min(prices), max(prices)
+    if high == low:
+        # Give a flat line some headroom so it doesn't sit on the frame
+        low, high = low * 0.95, high * 1.05 or 1
+
+    def x(ts):
+        return left + (ts - start) / (end - start) * (right - left)
+
+    def y(price):
+        return bottom - (price - low) / (high - low) * (bottom - top)
+
+    # Horizontal grid with price labels
+    for i in range(5):
+        price = low + (high - low) * i / 4
+        gy = y(price)
+        draw.line([(left, gy), (right, gy)], fill=GRID)
+        draw.text((8, gy - 6), f"Rs {price:,.0f}", fill=TEXT, font=font)
+
+    line = []
+    for (ts, price), (next_ts, _) in zip(points, points[1:] + [(end, None)]):
+        line.append((x(ts), y(price)))
+        line.append((x(next_ts), y(price)))
+    draw.line(line, fill=LINE, width=2)
+
+    draw.text((left, bottom + 10), datetime.fromtimestamp(start).strftime('%d %b %Y'), fill=TEXT, font=font)
+    end_label = datetime.fromtimestamp(end).strftime('%d %b %Y')
+    draw.text((right - draw.textlength(end_label, font=font), bottom + 10), end_label, fill=TEXT, font=font)
+    return _to_png(image)
+
+def _to_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
@@ -0,0 +1,155 @@
+"""Query-plan regression check for database.py.
+
+Finds every SQL statement passed to execute()/executemany() in database.py, runs
+EXPLAIN QUERY PLAN on it against a freshly created database and exits non-zero
+if any of them scans a whole table. Statements that scan on purpose carry a
+'-- full scan:' comment explaining why and are skipped.
+
+Besides literals, SQL may come from module constants, from f-strings built out of
+those, or from a helper's parameter; a parameter is resolved from every call of the
+helper, so each variant it can run (e.g. an upsert with and without RETURNING) is
+checked. A statement that can't be resolved this way also fails the check, so new
+dynamic SQL can't slip past it unnoticed.
+
+    python check_query_plans.py
+"""
+import ast
+import itertools
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import database
+
+FULL_SCAN_OK = '-- full scan:'
+DML = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.I)
+
+def _module_strings(tree):
+    """Returns the module-level string constants, read from the imported module so computed ones resolve too."""
+    names = {
+        target.id for node in tree.body if isinstance(node, ast.Assign)
+        for target in node.targets if isinstance(target, ast.Name)
+    }
+    return {name: getattr(database, name) for name in names if isinstance(getattr(database, name, None), str)}
+
+def _call_name(call):
+    return call.func.attr if isinstance(call.func, ast.Attribute) else getattr(call.func, 'id', None)
+
+def _bound_args(tree, func):
+    """Returns {param: expr} for every call of `func` in the module."""
+    params = [arg.arg for arg in func.args.args]
+    if params and params[0] == 'self':
+        params = params[1:]
+    calls = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _call_name(node) == func.name:
+            bound = dict(zip(params, node.args))
+            bound.update({kw.arg: kw.value for kw in node.keywords if kw.arg})
+            calls.append(bound)
+    return calls
+
+def _resolve(expr, constants, calls=None):
+    """Returns every string `expr` can evaluate to, or None if it can't be worked out statically.
+
+    `calls` holds the enclosing function's bound call arguments, for SQL passed in as a parameter.
+    """
+    if isinstance(expr, ast.Constant) and isinstance(expr.value, str):
+        return [expr.value]
+    if isinstance(expr, ast.Name):
+        if calls is not None and expr.id in calls[0]:
+            values = []
+            for bound in calls:
+                resolved = _resolve(bound[expr.id], constants) if expr.id in bound else None
+                if resolved is None:
+                    return None
+                values.extend(resolved)
+            return values
+        return [constants[expr.id]] if expr.id in constants else None
+    if isinstance(expr, ast.JoinedStr):
+        parts = []
+        for value in expr.values:
+            if isinstance(value, ast.Constant):
+                parts.append([value.value])
+            else:
+                resolved = _resolve(value.value, constants, calls)
+                if resolved is None:
+                    return None
+                parts.append(resolved)
+        return [''.join(combo) for combo in itertools.product(*parts)]
+    return None
+
+def _leading_text(expr):
+    """Returns the literal text a statement starts with, to tell queries from pragmas and DDL."""
+    if isinstance(expr, ast.Constant) and isinstance(expr.value, str):
+        return expr.value
+    if isinstance(expr, ast.JoinedStr) and expr.values and isinstance(expr.values[0], ast.Constant):
+        return expr.values[0].value
+    return ''
+
+def collect_statements(path=database.__file__):
+    """Returns ([(line, sql)], [unresolved line]) for the statements handed to execute()/executemany()."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    constants = _module_strings(tree)
+
+    statements, seen, unresolved = [], set(), []
+    for func in ast.walk(tree):
+        if not isinstance(func, ast.FunctionDef):
+            continue
+        calls = None
+        for node in ast.walk(func):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ('execute', 'executemany') and node.args):
+                continue
+            arg = node.args[0]
+            leading = _leading_text(arg)
+            if leading.strip() and not DML.match(leading):
+                continue  # pragmas and DDL have no query plan worth checking
+            if calls is None:
+                calls = _bound_args(tree, func) or [{}]
+            sqls = _resolve(arg, constants, calls)
+            if sqls is None:
+                unresolved.append(node.lineno)
+                continue
+            for sql in sqls:
+                if DML.match(sql) and sql not in seen:
+                    seen.add(sql)
+                    statements.append((node.lineno, sql))
+    return statements, unresolved
+
+def find_full_scans(conn, statements):
+    """Returns (line, sql, plan detail) for each statement whose plan scans a whole table."""
+    problems = []
+    for line, sql in statements:
+        if FULL_SCAN_OK in sql:
+            continue
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count('?')).fetchall()
+        except sqlite3.OperationalError as e:
+            problems.append((line, sql, f"could not explain: {e}"))
+            continue
+        for *_, detail in plan:
+            # 'SCAN <table or alias>' walks every row; SEARCH and constant rows are fine
+            if re.match(r'SCAN (?!CONSTANT ROW)\w', detail):
+                problems.append((line, sql, detail))
+    return problems
+
+def main():
+    statements, unresolved = collect_statements()
+    with tempfile.TemporaryDirectory() as tmp:
+        # An explicit path, so a host with a /data volume never checks its live database
+        db = database.Database(db_path=os.path.join(tmp, 'plans.db'))
+        problems = find_full_scans(db.conn, statements)
+        db.close()
+
+    for line, sql, detail in problems:
+        print(f"database.py:{line}: {detail}\n    {' '.join(sql.split())}")
+    for line in unresolved:
+        print(f"database.py:{line}: SQL can't be resolved statically; use a literal or a module constant")
+    print(f"{len(statements)} statement(s) checked, {len(problems)} with full table scans, "
+          f"{len(unresolved)} unresolved.")
+    return 1 if problems or unresolved else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,69 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 PRICE_ALERT_THRESHOLD = float(os.getenv('PRICE_ALERT_THRESHOLD', '5'))
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '60'))
+PRICE_FLUSH_BATCH = int(os.getenv('PRICE_FLUSH_BATCH', '500'))  # Price updates written per transaction
+ALERT_SEND_WORKERS = int(os.getenv('ALERT_SEND_WORKERS', '8'))  # Concurrent Telegram sends for price alerts
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))  # Messages/sec across all chats
+TELEGRAM_CHAT_INTERVAL = float(os.getenv('TELEGRAM_CHAT_INTERVAL', '1'))  # Seconds between messages to one chat
+ALERT_DIGEST = os.getenv('ALERT_DIGEST', 'false').lower() in ('1', 'true', 'yes')  # One message per user per sweep
+ALERT_DIGEST_WINDOW = float(os.getenv('ALERT_DIGEST_WINDOW', '0'))  # Extra seconds to collect alerts into a digest
+ALERT_POLL_INTERVAL = float(os.getenv('ALERT_POLL_INTERVAL', '5'))  # Seconds between outbox polls
+ALERT_MAX_ATTEMPTS = int(os.getenv('ALERT_MAX_ATTEMPTS', '10'))  # Delivery attempts before an alert is given up
+ALERT_RETRY_BASE = float(os.getenv('ALERT_RETRY_BASE', '10'))  # Seconds before the first retry, doubled each time
+ALERT_RETRY_MAX = float(os.getenv('ALERT_RETRY_MAX', '3600'))  # Longest wait between retries
+
+# Price history compaction
+HISTORY_RAW_DAYS = int(os.getenv('HISTORY_RAW_DAYS', '7'))  # Keep every observation this long
+HISTORY_HOURLY_DAYS = int(os.getenv('HISTORY_HOURLY_DAYS', '90'))  # Then hourly buckets this long, then daily
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '730'))  # Drop daily buckets after this (0 = never)
+HISTORY_ROLLUP_INTERVAL = int(os.getenv('HISTORY_ROLLUP_INTERVAL', '6'))  # Hours between rollup runs
+HISTORY_ROLLUP_BATCH = int(os.getenv('HISTORY_ROLLUP_BATCH', '50'))  # Products compacted per transaction
+HISTORY_ROLLUP_PAUSE = float(os.getenv('HISTORY_ROLLUP_PAUSE', '0.05'))  # Seconds to yield the write lock between batches
+
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', '256'))  # Rendered /history charts kept in memory
+
+# SQLite connection profile, applied to every connection at connect time
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))  # Bytes
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # Negative values are KiB
+SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))  # Milliseconds
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', '4'))  # Threads serving async handler queries
+
+# Scraper tuning
+SCRAPER_CONCURRENCY = int(os.getenv('SCRAPER_CONCURRENCY', '100'))  # Max in-flight fetches per sweep
+ADD_PRODUCT_TIMEOUT = float(os.getenv('ADD_PRODUCT_TIMEOUT', '30'))  # Seconds before giving up on a new product
+ADD_PRODUCT_PROGRESS_AFTER = float(os.getenv('ADD_PRODUCT_PROGRESS_AFTER', '5'))  # Seconds before a "still working" update
+SESSION_POOL_SIZE = int(os.getenv('SESSION_POOL_SIZE', '20'))  # Keep-alive connections per domain
+SESSION_IDLE_TIMEOUT = float(os.getenv('SESSION_IDLE_TIMEOUT', '120'))  # Seconds before idle connections are closed
+STREAM_PAGES = os.getenv('STREAM_PAGES', 'true').lower() in ('1', 'true', 'yes')  # Stop downloading once title and price are found
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '65536'))  # Bytes read per chunk while streaming
+STREAM_MAX_BYTES = int(os.getenv('STREAM_MAX_BYTES', '3145728'))  # Hard cap on bytes read per page
+
+SUPPORTED_DOMAINS = ('amazon.in', 'flipkart.com', 'myntra.com')
+
+# Page parser per domain, 'soup' or 'lxml', e.g. PARSER_BACKENDS="flipkart.com=lxml,amazon.in=soup"
+PARSER_BACKENDS = {
+    domain.strip(): backend.strip()
+    for domain, backend in (
+        item.split('=', 1) for item in os.getenv('PARSER_BACKENDS', '').split(',') if item.strip()
+    )
+}
+
+def _parse_rate_limit(value):
+    """Parses 'rate:burst:min_interval' (requests/sec, bucket size, seconds between requests)."""
+    rate, burst, min_interval = value.split(':')
+    return float(rate), int(burst), float(min_interval)
+
+# Per-domain politeness, e.g. DOMAIN_RATE_LIMITS="amazon.in=1:3:0.5,flipkart.com=2:5:0.2"
+DEFAULT_RATE_LIMIT = _parse_rate_limit(os.getenv('DEFAULT_RATE_LIMIT', '2:5:0.2'))
+DOMAIN_RATE_LIMITS = {
+    domain.strip(): _parse_rate_limit(limit)
+    for domain, limit in (
+        item.split('=', 1) for item in os.getenv('DOMAIN_RATE_LIMITS', '').split(',') if item.strip()
+    )
+}
 
 # Validate required variables
 if not BOT_TOKEN:
@@ -16,3 +79,4 @@ if not BOT_TOKEN:
 print(f"✅ Configuration loaded:")
 print(f"   • Price alert threshold: {PRICE_ALERT_THRESHOLD}%")
 print(f"   • Check interval: {CHECK_INTERVAL} minutes")
+print(f"   • Scraper concurrency: {SCRAPER_CONCURRENCY}")
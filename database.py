@@ -1,38 +1,217 @@
 import sqlite3
 import logging
 import os
+import threading
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from canonical import canonicalize
+from config import (
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE, SQLITE_TEMP_STORE, SQLITE_BUSY_TIMEOUT, DB_EXECUTOR_WORKERS
+)
 
 logger = logging.getLogger(__name__)
 
+# WAL lets the bot's reads run while the monitor is writing a sweep
+CONNECTION_PRAGMAS = {
+    'journal_mode': SQLITE_JOURNAL_MODE,
+    'synchronous': SQLITE_SYNCHRONOUS,
+    'mmap_size': SQLITE_MMAP_SIZE,
+    'cache_size': SQLITE_CACHE_SIZE,
+    'temp_store': SQLITE_TEMP_STORE,
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+}
+
+# SQLite reports these pragmas back as numbers
+PRAGMA_VALUE_CODES = {
+    'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+    'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2},
+}
+
+# Appends a price point only when it differs from the product's latest one, so
+# unchanged checks don't grow the table. Once the rollup has compacted a product's
+# raw points, its newest hourly or daily bucket stands in for the latest point.
+# Build the params with record_price_params().
+RECORD_PRICE_SQL = """
+INSERT OR IGNORE INTO price_history (catalog_id, ts, price_paise)
+SELECT ?, ?, ?
+WHERE ? IS NOT COALESCE(
+    (SELECT price_paise FROM price_history WHERE catalog_id = ? ORDER BY ts DESC LIMIT 1),
+    (SELECT last_paise FROM price_history_rollup WHERE catalog_id = ? AND resolution = 3600
+     ORDER BY bucket_ts DESC LIMIT 1),
+    (SELECT last_paise FROM price_history_rollup WHERE catalog_id = ? AND resolution = 86400
+     ORDER BY bucket_ts DESC LIMIT 1)
+)
+"""
+
+# An existing product keeps its last checked price: overwriting it here would hide
+# the change from the monitor, and existing subscribers would never get an alert
+CATALOG_UPSERT_SQL = """
+INSERT INTO catalog (product_key, url, title, last_checked_price)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(product_key) DO UPDATE SET
+last_checked_price=COALESCE(catalog.last_checked_price, excluded.last_checked_price), title=excluded.title
+"""
+
+# The no-op update (rather than DO NOTHING) makes RETURNING yield the existing row's id
+SUBSCRIPTION_UPSERT_SQL = """
+INSERT INTO subscriptions (user_id, catalog_id, initial_price)
+VALUES (?, ?, ?)
+ON CONFLICT(user_id, catalog_id) DO UPDATE SET user_id=excluded.user_id
+"""
+
+# Params: etag, last_modified, title, price, updated_at, catalog_id
+HTTP_CACHE_UPSERT_SQL = """
+INSERT INTO http_cache (product_key, etag, last_modified, title, price, updated_at)
+SELECT product_key, ?, ?, ?, ?, ? FROM catalog WHERE id = ?
+ON CONFLICT(product_key) DO UPDATE SET
+etag=excluded.etag, last_modified=excluded.last_modified, title=excluded.title,
+price=excluded.price, updated_at=excluded.updated_at
+"""
+
+# INSERT ... RETURNING needs SQLite 3.35+; older builds fall back to a follow-up SELECT
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def to_paise(price):
+    """Converts a rupee price to integer paise for compact storage."""
+    return int(round(price * 100))
+
+def record_price_params(catalog_id, ts, price):
+    """Returns the parameters RECORD_PRICE_SQL expects for one price point."""
+    paise = to_paise(price)
+    return (catalog_id, ts, paise, paise, catalog_id, catalog_id, catalog_id)
+
 class Database:
-    def __init__(self, db_name='products.db'):
-        """Initializes the database connection and creates/updates tables."""
+    def __init__(self, db_name='products.db', db_path=None):
+        """Initializes the database connection and creates/updates tables.
+
+        `db_path` opens exactly that file, bypassing the Railway volume lookup.
+        """
         # Use Railway's persistent volume if it exists, otherwise use local file
-        db_path = '/data/products.db' if os.path.exists('/data') else db_name
+        if db_path is None:
+            db_path = '/data/products.db' if os.path.exists('/data') else db_name
         self.db_name = db_path
-        self.conn = None
+        # Each thread gets its own connection so the monitor's writes and the
+        # bot's reads never share cursor state; WAL lets them run concurrently
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
         try:
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            self._verify_pragmas()
             self.create_tables()
             self._update_schema()  # Ensure schema is up-to-date
         except sqlite3.Error as e:
             logger.error(f"Database connection failed: {e}")
             raise
 
+    @property
+    def conn(self):
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self):
+        """Opens a connection and applies the configured connection profile."""
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT / 1000)
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def _verify_pragmas(self):
+        """Logs a warning for any pragma SQLite did not accept (e.g. WAL on an unsupported filesystem)."""
+        for pragma, expected in CONNECTION_PRAGMAS.items():
+            actual = self.conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            expected = PRAGMA_VALUE_CODES.get(pragma, {}).get(str(expected).upper(), expected)
+            if str(actual).lower() != str(expected).lower():
+                logger.warning(f"SQLite pragma {pragma} is {actual!r}, expected {expected!r}")
+        logger.info(f"SQLite connection profile applied: {CONNECTION_PRAGMAS}")
+
     def create_tables(self):
-        """Creates the database table if it doesn't exist."""
+        """Creates the catalog and subscriptions tables if they don't exist."""
         try:
             cursor = self.conn.cursor()
+            # One row per distinct product, shared by everyone who tracks it
             cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
+            CREATE TABLE IF NOT EXISTS catalog (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
+                product_key TEXT NOT NULL UNIQUE,
                 url TEXT NOT NULL,
                 title TEXT,
-                initial_price REAL,
                 last_checked_price REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            # One row per user tracking a catalog product
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                catalog_id INTEGER NOT NULL REFERENCES catalog(id),
+                initial_price REAL,
+                target_price REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, catalog_id)
+            )
+            """)
+            # Alerts are written with the price update that caused them and
+            # stay pending until Telegram has accepted them
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alerts_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                user_id INTEGER NOT NULL,
+                subscription_id INTEGER NOT NULL,
+                catalog_id INTEGER NOT NULL,
+                old_price REAL,
+                new_price REAL,
+                reason TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, url)
+                sent_at TIMESTAMP
+            )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_outbox_due ON alerts_outbox(status, next_attempt_at)")
+            # Integer paise and epoch seconds keep rows small; the primary key doubles
+            # as a covering index for per-product time range scans
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS price_history (
+                catalog_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price_paise INTEGER NOT NULL,
+                PRIMARY KEY (catalog_id, ts)
+            ) WITHOUT ROWID
+            """)
+            # Older history compacted into hourly (3600) and daily (86400) buckets
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS price_history_rollup (
+                catalog_id INTEGER NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket_ts INTEGER NOT NULL,
+                min_paise INTEGER NOT NULL,
+                max_paise INTEGER NOT NULL,
+                last_paise INTEGER NOT NULL,
+                PRIMARY KEY (catalog_id, resolution, bucket_ts)
+            ) WITHOUT ROWID
+            """)
+            # HTTP validators and the result they vouch for, so unchanged pages
+            # can be answered with a 304 instead of being downloaded again
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                product_key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                title TEXT,
+                price REAL,
+                updated_at REAL NOT NULL
             )
             """)
             self.conn.commit()
@@ -40,34 +219,85 @@ class Database:
             logger.error(f"Failed to create tables: {e}")
 
     def _update_schema(self):
-        """Adds new columns to the table for new features, ensuring backward compatibility."""
+        """Migrates older databases forward, ensuring backward compatibility."""
         try:
             cursor = self.conn.cursor()
+            cursor.execute("""
+            -- full scan: sqlite_master only holds a handful of rows
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'products'
+            """)
+            if cursor.fetchone() is None:
+                return
+
             cursor.execute("PRAGMA table_info(products)")
             columns = [info[1] for info in cursor.fetchall()]
             if 'target_price' not in columns:
                 cursor.execute("ALTER TABLE products ADD COLUMN target_price REAL")
                 self.conn.commit()
                 logger.info("Database schema updated with 'target_price' column.")
+
+            self._migrate_products_to_catalog()
         except sqlite3.Error as e:
             logger.error(f"Failed to update schema: {e}")
 
+    def _migrate_products_to_catalog(self):
+        """Splits the legacy per-user products table into catalog and subscriptions rows."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+        -- full scan: one-off copy of the whole legacy table
+        SELECT id, user_id, url, title, initial_price, last_checked_price, target_price, created_at
+        FROM products ORDER BY id
+        """)
+        rows = cursor.fetchall()
+        try:
+            for product_id, user_id, url, title, initial_price, last_price, target_price, created_at in rows:
+                product = canonicalize(url)
+                # Later rows are newer, so they win the shared title and price
+                cursor.execute("""
+                INSERT INTO catalog (product_key, url, title, last_checked_price, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(product_key) DO UPDATE SET
+                title=excluded.title, last_checked_price=excluded.last_checked_price
+                """, (product.key, product.url, title, last_price, created_at))
+                cursor.execute("SELECT id FROM catalog WHERE product_key = ?", (product.key,))
+                catalog_id = cursor.fetchone()[0]
+                # Keep the old product id so buttons in existing chats still point at the right row
+                cursor.execute("""
+                INSERT OR IGNORE INTO subscriptions (id, user_id, catalog_id, initial_price, target_price, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, (product_id, user_id, catalog_id, initial_price, target_price, created_at))
+            cursor.execute("ALTER TABLE products RENAME TO products_legacy")
+            self.conn.commit()
+            logger.info(f"Migrated {len(rows)} legacy product rows into catalog/subscriptions.")
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def _upsert_returning_id(self, cursor, upsert_sql, params, lookup_sql, lookup_params):
+        """Runs an upsert and returns the row's id, in a single statement when SQLite supports RETURNING."""
+        if SUPPORTS_RETURNING:
+            return cursor.execute(f"{upsert_sql} RETURNING id", params).fetchone()[0]
+        cursor.execute(upsert_sql, params)
+        return cursor.execute(lookup_sql, lookup_params).fetchone()[0]
+
     def add_product(self, user_id, url, title, price):
-        """Adds a new product and returns its ID."""
+        """Adds a product to the user's subscriptions and returns the subscription ID."""
+        product = canonicalize(url)
         try:
             cursor = self.conn.cursor()
-            cursor.execute("""
-            INSERT INTO products (user_id, url, title, initial_price, last_checked_price)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(user_id, url) DO UPDATE SET
-            last_checked_price=excluded.last_checked_price, title=excluded.title
-            """, (user_id, url, title, price, price))
+            catalog_id = self._upsert_returning_id(
+                cursor, CATALOG_UPSERT_SQL, (product.key, product.url, title, price),
+                "SELECT id FROM catalog WHERE product_key = ?", (product.key,)
+            )
+            cursor.execute(RECORD_PRICE_SQL, record_price_params(catalog_id, int(time.time()), price))
+            product_id = self._upsert_returning_id(
+                cursor, SUBSCRIPTION_UPSERT_SQL, (user_id, catalog_id, price),
+                "SELECT id FROM subscriptions WHERE user_id = ? AND catalog_id = ?", (user_id, catalog_id)
+            )
             self.conn.commit()
-            # Get the ID of the inserted or updated row
-            cursor.execute("SELECT id FROM products WHERE user_id = ? AND url = ?", (user_id, url))
-            product_id = cursor.fetchone()[0]
             return product_id
         except sqlite3.Error as e:
+            self.conn.rollback()
             logger.error(f"Failed to add product for user {user_id}: {e}")
             return None
 
@@ -75,17 +305,39 @@ class Database:
         """Retrieves all products for a user, including target price."""
         try:
             cursor = self.conn.cursor()
-            cursor.execute("SELECT id, title, initial_price, last_checked_price, url, target_price FROM products WHERE user_id = ?", (user_id,))
+            cursor.execute("""
+            SELECT s.id, c.title, s.initial_price, c.last_checked_price, c.url, s.target_price
+            FROM subscriptions s JOIN catalog c ON c.id = s.catalog_id
+            WHERE s.user_id = ?
+            """, (user_id,))
             return cursor.fetchall()
         except sqlite3.Error as e:
             logger.error(f"Failed to get products for user {user_id}: {e}")
             return []
             
+    def get_user_product(self, user_id, product_id):
+        """Retrieves (catalog_id, title, url) for one of the user's subscriptions, or None."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+            SELECT s.catalog_id, c.title, c.url
+            FROM subscriptions s JOIN catalog c ON c.id = s.catalog_id
+            WHERE s.id = ? AND s.user_id = ?
+            """, (product_id, user_id))
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get product {product_id} for user {user_id}: {e}")
+            return None
+
     def get_all_products(self):
-        """Retrieves all products for the scheduler, including target price."""
+        """Retrieves every subscription with its catalog product for the scheduler."""
         try:
             cursor = self.conn.cursor()
-            cursor.execute("SELECT id, user_id, url, title, last_checked_price, target_price FROM products")
+            cursor.execute("""
+            -- full scan: every sweep checks every subscription
+            SELECT s.id, s.catalog_id, s.user_id, c.url, c.title, c.last_checked_price, s.target_price
+            FROM subscriptions s JOIN catalog c ON c.id = s.catalog_id
+            """)
             return cursor.fetchall()
         except sqlite3.Error as e:
             logger.error(f"Failed to get all products: {e}")
@@ -95,33 +347,274 @@ class Database:
         """Sets or updates the target price for a product."""
         try:
             cursor = self.conn.cursor()
-            cursor.execute("UPDATE products SET target_price = ? WHERE id = ? AND user_id = ?", (target_price, product_id, user_id))
+            cursor.execute("UPDATE subscriptions SET target_price = ? WHERE id = ? AND user_id = ?", (target_price, product_id, user_id))
             self.conn.commit()
             return cursor.rowcount > 0 # Returns True if a row was updated
         except sqlite3.Error as e:
             logger.error(f"Failed to set target price for product {product_id}: {e}")
             return False
 
-    def update_product_price(self, product_id, new_price):
-        """Updates the last checked price of a product."""
+    def update_product_price(self, catalog_id, new_price):
+        """Updates the last checked price of a catalog product for all of its subscribers."""
+        return self.update_prices_bulk([(catalog_id, new_price)])
+
+    def update_prices_bulk(self, updates, alerts=(), deliver_after=0, validators=()):
+        """Updates many catalog prices and queues their alerts in a single transaction.
+
+        `updates` holds (catalog_id, new_price) pairs and `alerts` holds
+        (idempotency_key, user_id, subscription_id, catalog_id, old_price, new_price, reason)
+        tuples. Alerts whose key is already in the outbox are ignored; they become due
+        `deliver_after` seconds from now. `validators` holds changed
+        (catalog_id, etag, last_modified, title, price) tuples for the HTTP cache.
+        """
+        if not updates and not alerts and not validators:
+            return True
+        try:
+            with self.conn:
+                now = int(time.time())
+                self.conn.executemany(RECORD_PRICE_SQL, [
+                    record_price_params(catalog_id, now, new_price) for catalog_id, new_price in updates
+                ])
+                self.conn.executemany(
+                    "UPDATE catalog SET last_checked_price = ? WHERE id = ?",
+                    [(new_price, catalog_id) for catalog_id, new_price in updates]
+                )
+                due_at = time.time() + deliver_after
+                self.conn.executemany("""
+                INSERT OR IGNORE INTO alerts_outbox
+                (idempotency_key, user_id, subscription_id, catalog_id, old_price, new_price, reason, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(*alert, due_at) for alert in alerts])
+                self.conn.executemany(HTTP_CACHE_UPSERT_SQL, [
+                    (etag, last_modified, title, price, now, catalog_id)
+                    for catalog_id, etag, last_modified, title, price in validators
+                ])
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to bulk update {len(updates)} prices: {e}")
+            return False
+
+    def get_price_history(self, catalog_id, since=0, until=None):
+        """Retrieves (epoch_ts, price) points for a catalog product within a time range.
+
+        Compacted periods contribute one point per rollup bucket (its last price).
+        Prices are only stored when they change, so the series starts with the price
+        in effect at `since`, i.e. the latest point before it.
+        """
         try:
+            until = until if until is not None else int(time.time())
             cursor = self.conn.cursor()
-            cursor.execute("UPDATE products SET last_checked_price = ? WHERE id = ?", (new_price, product_id))
+            cursor.execute("""
+            SELECT COALESCE(
+                (SELECT price_paise FROM price_history WHERE catalog_id = ? AND ts < ?
+                 ORDER BY ts DESC LIMIT 1),
+                (SELECT last_paise FROM price_history_rollup WHERE catalog_id = ? AND resolution = 3600
+                 AND bucket_ts < ? ORDER BY bucket_ts DESC LIMIT 1),
+                (SELECT last_paise FROM price_history_rollup WHERE catalog_id = ? AND resolution = 86400
+                 AND bucket_ts < ? ORDER BY bucket_ts DESC LIMIT 1)
+            )
+            """, (catalog_id, since, catalog_id, since, catalog_id, since))
+            start_paise = cursor.fetchone()[0]
+            cursor.execute("""
+            SELECT bucket_ts AS ts, last_paise FROM price_history_rollup
+            WHERE catalog_id = ? AND resolution IN (3600, 86400) AND bucket_ts BETWEEN ? AND ?
+            UNION ALL
+            SELECT ts, price_paise FROM price_history
+            WHERE catalog_id = ? AND ts BETWEEN ? AND ?
+            ORDER BY ts
+            """, (catalog_id, since, until, catalog_id, since, until))
+            points = [(ts, paise / 100) for ts, paise in cursor.fetchall()]
+            if start_paise is not None and not (points and points[0][0] == since):
+                points.insert(0, (since, start_paise / 100))
+            return points
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get price history for catalog ID {catalog_id}: {e}")
+            return []
+
+    def get_catalog_ids_after(self, after_id, limit):
+        """Retrieves the next page of catalog IDs, for jobs that walk the catalog in batches."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT id FROM catalog WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+            return [row[0] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Failed to page catalog IDs after {after_id}: {e}")
+            return []
+
+    def rollup_raw_history(self, catalog_ids, cutoff):
+        """Compacts raw price points older than `cutoff` into hourly buckets, in one transaction."""
+        self._rollup(catalog_ids, cutoff, """
+            SELECT catalog_id, ts / 3600 * 3600 AS bucket,
+                   price_paise AS lo, price_paise AS hi, price_paise AS last, ts
+            FROM price_history WHERE catalog_id = ? AND ts < ?
+        """, 3600, "DELETE FROM price_history WHERE catalog_id = ? AND ts < ?")
+
+    def rollup_hourly_history(self, catalog_ids, cutoff):
+        """Compacts hourly buckets older than `cutoff` into daily buckets, in one transaction."""
+        self._rollup(catalog_ids, cutoff, """
+            SELECT catalog_id, bucket_ts / 86400 * 86400 AS bucket,
+                   min_paise AS lo, max_paise AS hi, last_paise AS last, bucket_ts AS ts
+            FROM price_history_rollup WHERE catalog_id = ? AND resolution = 3600 AND bucket_ts < ?
+        """, 86400, "DELETE FROM price_history_rollup WHERE catalog_id = ? AND resolution = 3600 AND bucket_ts < ?")
+
+    def _rollup(self, catalog_ids, cutoff, source_sql, resolution, delete_sql):
+        """Aggregates `source_sql` rows (catalog_id, bucket, min, max, last, ts) into `resolution`
+        buckets, merging with any existing bucket, then deletes the source rows."""
+        try:
+            with self.conn:
+                for catalog_id in catalog_ids:
+                    # The window picks the price of the newest source row in each bucket
+                    self.conn.execute(f"""
+                    INSERT INTO price_history_rollup (catalog_id, resolution, bucket_ts, min_paise, max_paise, last_paise)
+                    SELECT catalog_id, ?, bucket, MIN(lo), MAX(hi), last FROM (
+                        SELECT catalog_id, bucket, lo, hi,
+                               LAST_VALUE(last) OVER (PARTITION BY bucket ORDER BY ts
+                                   ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS last
+                        FROM ({source_sql})
+                    )
+                    GROUP BY bucket
+                    ON CONFLICT(catalog_id, resolution, bucket_ts) DO UPDATE SET
+                    min_paise=MIN(min_paise, excluded.min_paise),
+                    max_paise=MAX(max_paise, excluded.max_paise),
+                    last_paise=excluded.last_paise
+                    """, (resolution, catalog_id, cutoff))
+                    self.conn.execute(delete_sql, (catalog_id, cutoff))
+        except sqlite3.Error as e:
+            logger.error(f"Failed to roll up price history to {resolution}s buckets: {e}")
+
+    def purge_history(self, catalog_ids, cutoff):
+        """Deletes daily history buckets older than `cutoff` (retention), in one transaction."""
+        try:
+            with self.conn:
+                self.conn.executemany("""
+                DELETE FROM price_history_rollup WHERE catalog_id = ? AND resolution = 86400 AND bucket_ts < ?
+                """, [(catalog_id, cutoff) for catalog_id in catalog_ids])
+        except sqlite3.Error as e:
+            logger.error(f"Failed to purge old price history: {e}")
+
+    def get_http_validators(self):
+        """Returns {url: (etag, last_modified, title, price)} for every catalog product with stored validators."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+            -- full scan: loaded once per sweep, which checks every product
+            SELECT c.url, h.etag, h.last_modified, h.title, h.price
+            FROM catalog c JOIN http_cache h ON h.product_key = c.product_key
+            """)
+            return {url: tuple(validators) for url, *validators in cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get HTTP validators: {e}")
+            return {}
+
+    def get_due_alerts(self, limit=500):
+        """Retrieves pending alerts whose next attempt is due, oldest first."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+            SELECT o.id, o.user_id, o.catalog_id, c.title, c.url, o.old_price, o.new_price, o.reason, o.attempts,
+                   s.target_price
+            FROM alerts_outbox o JOIN catalog c ON c.id = o.catalog_id
+            LEFT JOIN subscriptions s ON s.id = o.subscription_id
+            WHERE o.status = 'pending' AND o.next_attempt_at <= ?
+            ORDER BY o.next_attempt_at
+            LIMIT ?
+            """, (time.time(), limit))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get due alerts: {e}")
+            return []
+
+    def mark_alerts_sent(self, alert_ids):
+        """Marks outbox alerts as delivered."""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE alerts_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    [(alert_id,) for alert_id in alert_ids]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to mark alerts {alert_ids} as sent: {e}")
+
+    def reschedule_alerts(self, alert_ids, error, next_attempt_at):
+        """Records a failed delivery attempt and when to try again."""
+        try:
+            with self.conn:
+                self.conn.executemany("""
+                UPDATE alerts_outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?
+                WHERE id = ?
+                """, [(error, next_attempt_at, alert_id) for alert_id in alert_ids])
+        except sqlite3.Error as e:
+            logger.error(f"Failed to reschedule alerts {alert_ids}: {e}")
+
+    def mark_alerts_failed(self, alert_ids, error):
+        """Gives up on outbox alerts that cannot be delivered."""
+        try:
+            with self.conn:
+                self.conn.executemany("""
+                UPDATE alerts_outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+                WHERE id = ?
+                """, [(error, alert_id) for alert_id in alert_ids])
+        except sqlite3.Error as e:
+            logger.error(f"Failed to mark alerts {alert_ids} as failed: {e}")
+
+    def purge_sent_alerts(self, older_than_days=7):
+        """Deletes delivered alerts older than the given number of days."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+            DELETE FROM alerts_outbox WHERE status = 'sent' AND sent_at < datetime('now', ?)
+            """, (f"-{older_than_days} days",))
             self.conn.commit()
+            return cursor.rowcount
         except sqlite3.Error as e:
-            logger.error(f"Failed to update price for product ID {product_id}: {e}")
+            logger.error(f"Failed to purge sent alerts: {e}")
+            return 0
 
     def delete_product(self, user_id, product_id):
         """Deletes a product from a user's tracking list."""
         try:
             cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM products WHERE id = ? AND user_id = ?", (product_id, user_id))
+            cursor.execute("DELETE FROM subscriptions WHERE id = ? AND user_id = ?", (product_id, user_id))
             self.conn.commit()
         except sqlite3.Error as e:
             logger.error(f"Failed to delete product ID {product_id} for user {user_id}: {e}")
 
+    def close(self):
+        """Closes every connection opened by any thread. The database can't be used afterwards."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
     def __del__(self):
-        """Closes the database connection when the object is destroyed."""
-        if self.conn:
-            self.conn.close()
+        """Closes the database connections when the object is destroyed."""
+        if getattr(self, '_connections', None):
+            self.close()
+
+class AsyncDatabase:
+    """Awaitable facade over Database for use inside async handlers.
+
+    Every method of the wrapped Database is available as a coroutine that runs on a
+    dedicated thread pool, so a busy SQLite file never blocks the bot's event loop.
+    Each worker thread uses its own pooled connection.
+    """
+
+    def __init__(self, db, max_workers=DB_EXECUTOR_WORKERS):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def run_in_executor(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+        return run_in_executor
 
+    def shutdown(self):
+        """Stops the worker threads once queued queries have finished."""
+        self.executor.shutdown(wait=True)
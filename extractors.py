@@ -0,0 +1,170 @@
+import re
+import soupsieve as sv
+import lxml.html
+from bs4 import BeautifulSoup
+from lxml.cssselect import CSSSelector
+from urllib.parse import urlparse
+from config import PARSER_BACKENDS
+
+PRICE_CLEAN_RE = re.compile(r'[^\d.]')
+# An id, class or attribute value a selector requires, e.g. 'productTitle' in '#productTitle'
+SELECTOR_NAME_RE = re.compile(r'[#.]([\w-]+)|=\s*["\']?([^"\'\]]+)')
+
+# domain -> extractor instance, filled in by @register
+EXTRACTORS = {}
+
+def register(cls):
+    """Class decorator that registers an extractor for each of its domains."""
+    instance = cls()
+    for domain in cls.domains:
+        EXTRACTORS[domain] = instance
+    return cls
+
+def get_extractor(url):
+    """Returns the extractor for a URL's site, matching the netloc like SUPPORTED_DOMAINS does."""
+    netloc = urlparse(url).netloc.lower()
+    for domain, extractor in EXTRACTORS.items():
+        if domain in netloc:
+            return extractor
+    return GENERIC_EXTRACTOR
+
+def parse_price(text):
+    """Turns displayed price text such as '₹1,299.00' into a float, or None."""
+    cleaned_price = PRICE_CLEAN_RE.sub('', text)
+    if cleaned_price:
+        try:
+            return float(cleaned_price)
+        except ValueError:
+            return None
+    return None
+
+def _lxml_text(element):
+    """Matches BeautifulSoup's get_text(strip=True): every text fragment stripped, then joined."""
+    return ''.join(fragment.strip() for fragment in element.itertext())
+
+def _is_complete(element):
+    """True once a partially parsed tree has moved past the element, so its text is final."""
+    while element is not None:
+        if element.getnext() is not None:
+            return True
+        element = element.getparent()
+    return False
+
+def _needle(selectors):
+    """Returns bytes that must appear in the markup of any element the top selector matches, or None."""
+    if not selectors:
+        return None
+    names = [a or b for a, b in SELECTOR_NAME_RE.findall(selectors[0])]
+    return max(names, key=len).encode() if names else None
+
+class Extractor:
+    """Pulls the title and price out of one site's product pages.
+
+    Subclasses list their site's selectors in priority order; they are compiled
+    once when the class is defined, both for soupsieve and as lxml XPath, so pages
+    only pay for matching. `backend` picks the parser: 'soup' wraps the lxml tree in
+    BeautifulSoup objects, 'lxml' queries the lxml tree directly, which is much
+    cheaper on large pages. PARSER_BACKENDS can override it per domain.
+    """
+    domains = ()
+    title_selectors = ()
+    price_selectors = ()
+    backend = 'soup'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.compiled_title_selectors = [sv.compile(selector) for selector in cls.title_selectors]
+        cls.compiled_price_selectors = [sv.compile(selector) for selector in cls.price_selectors]
+        cls.xpath_title_selectors = [CSSSelector(selector) for selector in cls.title_selectors]
+        cls.xpath_price_selectors = [CSSSelector(selector) for selector in cls.price_selectors]
+        # Streaming only queries the partial tree once a chunk mentions these
+        cls.primary_title_needle = _needle(cls.title_selectors)
+        cls.primary_price_needle = _needle(cls.price_selectors)
+        for domain in cls.domains:
+            cls.backend = PARSER_BACKENDS.get(domain, cls.backend)
+
+    def extract(self, content, backend=None):
+        """Parses page bytes with the chosen backend and returns (title, price)."""
+        if (backend or self.backend) == 'lxml':
+            root = lxml.html.fromstring(content)
+            return self.extract_title_lxml(root), self.extract_price_lxml(root)
+        soup = BeautifulSoup(content, 'lxml')
+        return self.extract_title(soup), self.extract_price(soup)
+
+    def extract_title_lxml(self, root):
+        """Extracts the product title from an lxml tree."""
+        for selector in self.xpath_title_selectors:
+            elements = selector(root)
+            if elements:
+                return _lxml_text(elements[0])
+        return "Product Title Not Found"
+
+    def extract_price_lxml(self, root):
+        """Extracts and cleans the product price from an lxml tree."""
+        for selector in self.xpath_price_selectors:
+            elements = selector(root)
+            if elements:
+                price = parse_price(_lxml_text(elements[0]))
+                if price is not None:
+                    return price
+        return None
+
+    def extract_primary_lxml(self, title_element, price_element):
+        """Returns (title, price) from the first elements the top-priority selectors matched, or None.
+
+        Used on partially parsed pages: a lower-priority match might be overridden by
+        a better one further down, but the first element matching the top selector
+        is the same one a full parse would pick. None also means an element's text
+        may still be arriving.
+        """
+        if not _is_complete(title_element) or not _is_complete(price_element):
+            return None
+        title = _lxml_text(title_element)
+        price = parse_price(_lxml_text(price_element))
+        if not title or price is None:
+            return None
+        return title, price
+
+    def extract_title(self, soup):
+        """Extracts the product title using the site's selectors."""
+        for selector in self.compiled_title_selectors:
+            element = selector.select_one(soup)
+            if element:
+                return element.get_text(strip=True)
+        return "Product Title Not Found"
+
+    def extract_price(self, soup):
+        """Extracts and cleans the product price using the site's selectors."""
+        for selector in self.compiled_price_selectors:
+            element = selector.select_one(soup)
+            if element:
+                price = parse_price(element.get_text(strip=True))
+                if price is not None:
+                    return price
+        return None
+
+@register
+class AmazonExtractor(Extractor):
+    domains = ('amazon.in',)
+    title_selectors = ('#productTitle',)
+    price_selectors = ('.a-price-whole', '.a-offscreen')
+    backend = 'lxml'  # 1-2 MB pages; wrapping them in soup objects dominates parse time
+
+@register
+class FlipkartExtractor(Extractor):
+    domains = ('flipkart.com',)
+    title_selectors = ('.B_NuCI', '.VU-ZEz', 'h1')
+    price_selectors = ('._30jeq3', '.Nx9bqj')
+
+@register
+class MyntraExtractor(Extractor):
+    domains = ('myntra.com',)
+    title_selectors = ('.pdp-title', '.pdp-name', 'h1')
+    price_selectors = ('.pdp-price',)
+
+class GenericExtractor(Extractor):
+    """Fallback for sites without their own extractor."""
+    title_selectors = ('.product-title', 'h1', 'span[data-ui="product-title"]')
+    price_selectors = ('.product-price', 'span.price', 'span[data-testid="price"]')
+
+GENERIC_EXTRACTOR = GenericExtractor()
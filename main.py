@@ -10,13 +10,17 @@ from telegram.ext import (
     ConversationHandler
 )
 import re
+import asyncio
+import time
 import signal
 import sys
 from urllib.parse import urlparse
-from database import Database
+from database import Database, AsyncDatabase
 from scraper import ProductScraper
 from scheduler import PriceMonitor
-from config import BOT_TOKEN
+from canonical import canonicalize, is_short_link
+from charts import ChartCache, render_price_chart
+from config import BOT_TOKEN, SUPPORTED_DOMAINS, ADD_PRODUCT_TIMEOUT, ADD_PRODUCT_PROGRESS_AFTER
 
 # --- Configuration ---
 logging.basicConfig(
@@ -25,7 +29,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-SUPPORTED_DOMAINS = ('amazon.in', 'flipkart.com', 'myntra.com')
 ADMIN_CHAT_ID = 5682929226  # <-- IMPORTANT: Replace with your numeric Telegram chat ID
 
 # --- State definitions for conversations ---
@@ -34,7 +37,12 @@ SET_PRICE, FEEDBACK = range(2)
 # --- Initialize Components ---
 db = Database()
 scraper = ProductScraper()
-monitor = PriceMonitor()
+# Share one database pool and one scraper so both paths use the same connections and rate limits
+monitor = PriceMonitor(db=db, scraper=scraper)
+adb = AsyncDatabase(db)  # Handlers await this so SQLite never blocks the event loop
+chart_cache = ChartCache()
+
+HISTORY_RANGES = {7: "7D", 30: "30D", 90: "90D", 365: "1Y"}
 
 # --- Helper Functions ---
 def is_product_url(text):
@@ -42,6 +50,42 @@ def is_product_url(text):
     url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
     return re.search(url_pattern, text) is not None
 
+def is_supported_url(url):
+    """Check if a URL belongs to one of the supported sites."""
+    domain = urlparse(url).netloc
+    return any(d in domain for d in SUPPORTED_DOMAINS)
+
+async def resolve_and_fetch(url):
+    """Resolves share links and scrapes the canonical URL; returns (url, product_info).
+
+    product_info is None when the resolved URL isn't on a supported site.
+    """
+    if is_short_link(url):
+        url = await scraper.resolve_url(url)
+    # Store one stable URL per product, whatever variant of the link was shared
+    url = canonicalize(url).url
+    if not is_supported_url(url):
+        return url, None
+    return url, await scraper.fetch_product_info(url)
+
+async def scrape_with_progress(url, processing_msg):
+    """Resolves and scrapes a URL without blocking the bot, updating the status message if it takes a while.
+
+    Returns (url, product_info), or None if the whole thing ran past ADD_PRODUCT_TIMEOUT.
+    """
+    task = asyncio.create_task(resolve_and_fetch(url))
+    done, _ = await asyncio.wait({task}, timeout=ADD_PRODUCT_PROGRESS_AFTER)
+    if not done:
+        try:
+            await processing_msg.edit_text("⏳ Still working on it... The store is taking a while to respond.")
+        except Exception as e:
+            logger.warning(f"Could not update progress message: {e}")
+    try:
+        return await asyncio.wait_for(task, timeout=max(ADD_PRODUCT_TIMEOUT - ADD_PRODUCT_PROGRESS_AFTER, 0))
+    except asyncio.TimeoutError:
+        logger.warning(f"Timed out scraping {url} after {ADD_PRODUCT_TIMEOUT}s")
+        return None
+
 # --- Main Command Handlers ---
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Greets the user and shows the main menu."""
@@ -63,6 +107,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 • **/list:** View all your tracked products. From here, you can click on an item to view it, stop tracking it, or set a target price.
 
+• **/history:** See a price chart for any of your tracked products.
+
 • **Target Price:** Use the "🎯 Set Price" button in your product list to set a price goal. I will only notify you when the price drops below your target.
 
 • **/feedback:** Send a message directly to my developer for suggestions or bug reports.
@@ -79,7 +125,7 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     is_callback = update.callback_query is not None
 
-    products = db.get_user_products(user.id)
+    products = await adb.get_user_products(user.id)
 
     if not products:
         message_text = "You're not tracking any products yet! Send me a product URL to start."
@@ -103,6 +149,7 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
         keyboard.append([
             InlineKeyboardButton(product_display, url=url),
+            InlineKeyboardButton("📈", callback_data=f'history_{product_id}_30'),
             InlineKeyboardButton("🎯", callback_data=f'askprice_{product_id}'),
             InlineKeyboardButton("❌", callback_data=f'stop_{product_id}'),
         ])
@@ -127,34 +174,87 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Please send a valid product URL.")
         return
 
+    unsupported = f"Sorry, I only support these sites: {', '.join(SUPPORTED_DOMAINS)}"
     try:
-        domain = urlparse(url).netloc
-        if not any(d in domain for d in SUPPORTED_DOMAINS):
-            await update.message.reply_text(f"Sorry, I only support these sites: {', '.join(SUPPORTED_DOMAINS)}")
+        # Share links only reveal their site once resolved, which happens under the deadline below
+        if not is_short_link(url) and not is_supported_url(url):
+            await update.message.reply_text(unsupported)
             return
     except Exception:
         await update.message.reply_text("That link seems invalid. Please try again.")
         return
-    
+
     processing_msg = await update.message.reply_text("🔍 Analyzing product... Please wait.")
-    
-    product_info = scraper.get_product_info(url)
-    
+
+    result = await scrape_with_progress(url, processing_msg)
+    if result is None:
+        product_info = None
+    else:
+        url, product_info = result
+        if not is_supported_url(url):
+            await processing_msg.edit_text(unsupported)
+            return
+
     if not product_info or not product_info.get('price'):
         await processing_msg.edit_text("❌ Sorry, I couldn't extract product details from this URL.")
         return
     
-    product_id = db.add_product(user_id, url, product_info['title'], product_info['price'])
+    product_id = await adb.add_product(user_id, url, product_info['title'], product_info['price'])
     
     if product_id is None:
-        await processing_msg.edit_message_text("❌ An error occurred while adding the product to the database.")
+        await processing_msg.edit_text("❌ An error occurred while adding the product to the database.")
         return
 
     success_message = f"✅ **Now Tracking!**\n\n**Product:** {product_info['title']}\n**Current Price:** ₹{product_info['price']:.2f}"
     keyboard = [[InlineKeyboardButton("🎯 Set a Target Price", callback_data=f'askprice_{product_id}')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await processing_msg.edit_message_text(success_message, parse_mode='Markdown', reply_markup=reply_markup)
+    await processing_msg.edit_text(success_message, parse_mode='Markdown', reply_markup=reply_markup)
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Lets the user pick a tracked product to see its price chart."""
+    products = await adb.get_user_products(update.effective_user.id)
+    if not products:
+        await update.message.reply_text("You're not tracking any products yet! Send me a product URL to start.")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(f"📈 {(title or 'Unknown')[:40]}", callback_data=f'history_{product_id}_30')]
+        for product_id, title, *_ in products
+    ]
+    await update.message.reply_text("Which product's price history do you want to see?", reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def send_price_history(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id, days):
+    """Sends a PNG chart of a product's price over the last `days` days."""
+    user_id = update.effective_user.id
+    product = await adb.get_user_product(user_id, product_id)
+    if product is None:
+        await update.callback_query.message.reply_text("❌ I couldn't find that product in your list.")
+        return
+
+    catalog_id, title, url = product
+    now = int(time.time())
+    points = await adb.get_price_history(catalog_id, since=now - days * 86400, until=now)
+    # A new point changes the chart; otherwise a cached image is identical. The first
+    # point is pinned to the window start, so key on its price rather than its time.
+    # The window itself slides with the clock, so images are also only reused within the hour
+    changes = [ts for ts, _ in points if ts > now - days * 86400]
+    cache_key = (catalog_id, days, now // 3600, changes[-1] if changes else 0, points[0][1] if points else None)
+    chart = chart_cache.get(cache_key)
+    if chart is None:
+        # Rasterizing is CPU work, so keep it off the event loop
+        chart = await asyncio.to_thread(render_price_chart, title or "Unknown", points, now)
+        chart_cache.put(cache_key, chart)
+
+    keyboard = [[
+        InlineKeyboardButton(("• " if d == days else "") + label, callback_data=f'history_{product_id}_{d}')
+        for d, label in HISTORY_RANGES.items()
+    ]]
+    caption = f"📈 {title}\nLast {HISTORY_RANGES.get(days, f'{days}D')}"
+    await context.bot.send_photo(
+        chat_id=update.effective_chat.id, photo=chart, caption=caption[:1024],
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
 # --- Conversation Flow Handlers ---
 
@@ -172,7 +272,7 @@ async def save_target_price(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id
     try:
         target_price = float(update.message.text)
-        if db.set_target_price(product_id, user_id, target_price):
+        if await adb.set_target_price(product_id, user_id, target_price):
             await update.message.reply_text(f"✅ Great! I will notify you when the price drops below ₹{target_price:,.2f}.")
         else:
             await update.message.reply_text("❌ Something went wrong. I couldn't find that product to update.")
@@ -229,8 +329,11 @@ async def button_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data.startswith('stop_'):
         user_id = query.effective_user.id
         product_id = int(query.data.split('_')[1])
-        db.delete_product(user_id, product_id)
+        await adb.delete_product(user_id, product_id)
         await list_products(update, context) # Refresh the list
+    elif query.data.startswith('history_'):
+        _, product_id, days = query.data.split('_')
+        await send_price_history(update, context, int(product_id), int(days))
 
 # --- Main Application Setup ---
 def main():
@@ -261,6 +364,7 @@ def main():
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("list", list_products))
+    application.add_handler(CommandHandler("history", history_command))
     
     # 2. Add ConversationHandlers. These need to be before other text/button handlers.
     application.add_handler(set_price_conv)
@@ -268,10 +372,11 @@ def main():
     
     # 3. Add the generic button router for non-conversation buttons.
     # This pattern now correctly captures stop buttons with product IDs.
-    application.add_handler(CallbackQueryHandler(button_router, pattern=r'^(list_products|help|stop_\d+)'))
+    application.add_handler(CallbackQueryHandler(button_router, pattern=r'^(list_products|help|stop_\d+|history_\d+_\d+)'))
 
     # 4. Add the generic message handler LAST. This is the catch-all for URLs.
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_url))
+    # Non-blocking so one slow product add doesn't hold up other users' updates
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_url, block=False))
     
     monitor.start_monitoring()
     logger.info("🚀 Price Monitor Bot is running!")
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import re
+import time
+from collections import defaultdict
+from telegram.error import RetryAfter, Forbidden, BadRequest
+from ratelimit import TokenBucket
+from config import (
+    ALERT_SEND_WORKERS, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL,
+    ALERT_POLL_INTERVAL, ALERT_MAX_ATTEMPTS, ALERT_RETRY_BASE, ALERT_RETRY_MAX, ALERT_DIGEST,
+    PRICE_ALERT_THRESHOLD
+)
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects longer messages; digests are packed below the limit with headroom
+# for emojis, which count as two characters on Telegram's side
+TELEGRAM_MESSAGE_LIMIT = 4096
+DIGEST_MESSAGE_SIZE = TELEGRAM_MESSAGE_LIMIT - 256
+TITLE_MAX_LENGTH = 150
+MARKDOWN_SPECIAL_RE = re.compile(r'[_*`\[\]]')
+
+def clean_title(title):
+    """Removes Markdown control characters from a product title and truncates it."""
+    title = ' '.join(MARKDOWN_SPECIAL_RE.sub(' ', title or '').split())
+    if len(title) > TITLE_MAX_LENGTH:
+        title = title[:TITLE_MAX_LENGTH - 1].rstrip() + '…'
+    return title
+
+def price_change_reason(old_price, new_price):
+    """Describes a price move as a percentage, e.g. "dropped by 12.50%"."""
+    if new_price == old_price:
+        return "returned to its earlier level"
+    price_change_percent = ((new_price - old_price) / old_price) * 100
+    change_type = "dropped" if price_change_percent < 0 else "increased"
+    return f"{change_type} by {abs(price_change_percent):.2f}%"
+
+def alert_reason(old_price, new_price, target_price=None):
+    """Returns why a price move deserves an alert, or None if it doesn't."""
+    # Priority 1: Check if price dropped below the user's target price
+    if target_price and new_price <= target_price:
+        return f"dropped below your target of ₹{target_price:,.2f}"
+    # Priority 2: If no target price, check for the general percentage change
+    if not target_price and abs((new_price - old_price) / old_price) * 100 >= PRICE_ALERT_THRESHOLD:
+        return price_change_reason(old_price, new_price)
+    return None
+
+def format_alert(title, url, old_price, new_price, reason):
+    """Builds the Markdown text of a single price alert."""
+    emoji = "📉" if new_price < old_price else "📈"
+
+    return f"""
+{emoji} **Price Alert!** {emoji}
+
+**Product:** {clean_title(title)}
+The price has **{reason}**!
+
+**Old Price:** ₹{old_price:,.2f}
+**New Price:** ₹{new_price:,.2f}
+
+[View Product]({url})
+        """
+
+def format_digest(alerts):
+    """Packs (alert_ids, (title, url, old_price, new_price, reason)) pairs into digest messages.
+
+    Returns (alert_ids, text) per message, each short enough for Telegram, so a
+    message that fails only takes its own alerts down with it.
+    """
+    parts = []  # [alert_ids, lines, length]
+    for alert_ids, (title, url, old_price, new_price, reason) in alerts:
+        emoji = "📉" if new_price < old_price else "📈"
+        line = f"{emoji} [{clean_title(title)}]({url})\n   ₹{old_price:,.2f} → ₹{new_price:,.2f} ({reason})"
+        if not parts or parts[-1][2] + len(line) + 1 > DIGEST_MESSAGE_SIZE:
+            parts.append([[], [], 0])
+        parts[-1][0].extend(alert_ids)
+        parts[-1][1].append(line)
+        parts[-1][2] += len(line) + 1
+
+    messages = []
+    for number, (alert_ids, lines, _) in enumerate(parts, 1):
+        header = f"🛍️ **Price Alerts** ({len(alerts)} products)"
+        if len(parts) > 1:
+            header += f" {number}/{len(parts)}"
+        messages.append((alert_ids, "\n".join([header, "", *lines])))
+    return messages
+
+def merge_alerts(alerts):
+    """Collapses outbox rows for the same product into one, from the oldest old price to the newest new price.
+
+    A merged row's reason is recomputed from the merged prices and the subscription's
+    current target, so it always describes the move the message shows.
+    Returns (alert_ids, (title, url, old_price, new_price, reason)) per product.
+    """
+    merged = {}
+    for alert_id, _, catalog_id, title, url, old_price, new_price, reason, _, target_price in sorted(alerts):
+        if catalog_id in merged:
+            alert_ids, (_, _, first_old_price, _, _) = merged[catalog_id]
+            reason = (alert_reason(first_old_price, new_price, target_price)
+                      or price_change_reason(first_old_price, new_price))
+            merged[catalog_id] = (alert_ids + [alert_id], (title, url, first_old_price, new_price, reason))
+        else:
+            merged[catalog_id] = ([alert_id], (title, url, old_price, new_price, reason))
+    return list(merged.values())
+
+class AlertSender:
+    """Delivers price alerts from the durable alerts_outbox table through one long-lived bot client.
+
+    Delivery stays inside Telegram's limits: a global token bucket caps messages per
+    second across all chats, each chat gets at most one message per chat interval, and
+    a 429 pauses every worker for the retry_after the API asked for. An alert only
+    leaves the outbox once Telegram accepts it; other failures are retried with
+    exponential backoff, so a crash or outage delays alerts instead of losing them.
+
+    In digest mode every due alert for a user is sent as one message, with repeated
+    alerts for the same product merged, and nothing is released while a sweep is running.
+    """
+
+    def __init__(self, bot, db, workers=ALERT_SEND_WORKERS, global_rate=TELEGRAM_GLOBAL_RATE,
+                 chat_interval=TELEGRAM_CHAT_INTERVAL, poll_interval=ALERT_POLL_INTERVAL, digest=ALERT_DIGEST):
+        self.bot = bot
+        self.db = db
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.digest = digest
+        self.sweep_running = False  # set by the monitor; digests wait for the sweep to finish
+        self.queue = None
+        self._tasks = []
+        self._delayed = set()
+        self._in_flight = set()  # outbox ids currently queued or being sent
+        self._wake = None
+        self.global_bucket = TokenBucket(global_rate, burst=int(global_rate))
+        self.chat_interval = chat_interval
+        self._chat_next_allowed = {}  # chat_id -> monotonic time of its next free slot
+        self._paused_until = 0.0
+
+    async def start(self):
+        """Opens the bot's HTTP client and starts the outbox poller and sender workers."""
+        await self.bot.initialize()
+        self.queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        purged = await asyncio.to_thread(self.db.purge_sent_alerts)
+        if purged:
+            logger.info(f"Purged {purged} delivered alerts from the outbox.")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+        logger.info(f"Alert sender started with {self.workers} workers.")
+
+    async def stop(self):
+        """Stops the workers and closes the bot client; undelivered alerts stay in the outbox."""
+        for task in [*self._tasks, *self._delayed]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._delayed, return_exceptions=True)
+        self._tasks = []
+        await self.bot.shutdown()
+
+    def wake(self):
+        """Tells the poller new alerts were written so it doesn't wait for the next poll."""
+        self._wake.set()
+
+    async def flush(self):
+        """Waits until every alert picked up from the outbox has been handled."""
+        await self.queue.join()
+
+    async def _poll(self):
+        while True:
+            if not (self.digest and self.sweep_running):
+                await self._enqueue_due()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _enqueue_due(self):
+        """Queues due outbox alerts: one batch per alert, or one batch per user in digest mode."""
+        batches = defaultdict(list)
+        # Outbox reads and writes run on worker threads so SQLite never blocks the sends
+        for alert in await asyncio.to_thread(self.db.get_due_alerts):
+            if alert[0] not in self._in_flight:
+                self._in_flight.add(alert[0])
+                batches[alert[1] if self.digest else alert[0]].append(alert)
+        for batch in batches.values():
+            self.queue.put_nowait(batch)
+
+    def _chat_wait(self, chat_id):
+        """Returns how long until the chat's next send slot is free, without claiming it."""
+        return self._chat_next_allowed.get(chat_id, 0.0) - time.monotonic()
+
+    def _claim_chat_slot(self, chat_id):
+        """Marks the chat's slot as used from now on; called right before a send goes out."""
+        now = time.monotonic()
+        if len(self._chat_next_allowed) > 10000:
+            # Forget chats whose slots are already free again
+            self._chat_next_allowed = {c: t for c, t in self._chat_next_allowed.items() if t > now}
+        self._chat_next_allowed[chat_id] = now + self.chat_interval
+
+    async def _wait_for_send_slot(self, chat_id):
+        """Waits out a 429 pause, the chat's spacing and the global bucket, then claims the chat's slot."""
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            chat_wait = self._chat_wait(chat_id)
+            if chat_wait > 0:
+                await asyncio.sleep(chat_wait)
+                continue
+            delay = self.global_bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # A 429 or another send to this chat may have come in while we slept
+            if self._paused_until > time.monotonic() or self._chat_wait(chat_id) > 0:
+                continue
+            self._claim_chat_slot(chat_id)
+            return
+
+    async def _worker(self):
+        while True:
+            batch = await self.queue.get()
+            delay = self._chat_wait(batch[0][1])
+            if delay > 0:
+                # Don't hold a worker while one busy chat waits; other chats can go first
+                task = asyncio.create_task(self._deliver_later(delay, batch))
+                self._delayed.add(task)
+                task.add_done_callback(self._delayed.discard)
+            else:
+                await self._deliver(batch)
+
+    async def _deliver_later(self, delay, batch):
+        await asyncio.sleep(delay)
+        await self._deliver(batch)
+
+    async def _deliver(self, batch):
+        """Sends a batch of one user's outbox alerts and records the outcome of each message.
+
+        A batch is one message, or several when a digest is too long for one. A
+        BadRequest only fails the message it came from; anything else stops the batch.
+        """
+        user_id = batch[0][1]
+        attempts = max(alert[8] for alert in batch)
+        alerts = merge_alerts(batch)
+        if len(alerts) == 1:
+            messages = [(alerts[0][0], format_alert(*alerts[0][1]))]
+        else:
+            messages = format_digest(alerts)
+        remaining = [alert[0] for alert in batch]
+        try:
+            for alert_ids, text in messages:
+                try:
+                    await self._send(user_id, text)
+                except BadRequest as e:
+                    # This message can't be sent as written; retrying won't help
+                    await asyncio.to_thread(self.db.mark_alerts_failed, alert_ids, str(e))
+                    logger.error(f"Dropping alerts {alert_ids} for user {user_id}: {e}")
+                else:
+                    await asyncio.to_thread(self.db.mark_alerts_sent, alert_ids)
+                    logger.info(f"Notification with {len(alert_ids)} alert(s) sent to user {user_id}")
+                remaining = [alert_id for alert_id in remaining if alert_id not in alert_ids]
+        except Forbidden as e:
+            # The user blocked the bot or the chat is gone; retrying won't help
+            await asyncio.to_thread(self.db.mark_alerts_failed, remaining, str(e))
+            logger.error(f"Dropping alerts {remaining} for user {user_id}: {e}")
+        except Exception as e:
+            if attempts + 1 >= ALERT_MAX_ATTEMPTS:
+                await asyncio.to_thread(self.db.mark_alerts_failed, remaining, str(e))
+                logger.error(f"Giving up on alerts {remaining} for user {user_id} after {attempts + 1} attempts: {e}")
+            else:
+                backoff = min(ALERT_RETRY_BASE * 2 ** attempts, ALERT_RETRY_MAX)
+                await asyncio.to_thread(self.db.reschedule_alerts, remaining, str(e), time.time() + backoff)
+                logger.error(f"Failed to send notification to user {user_id}, retrying in {backoff:.0f}s: {e}")
+        finally:
+            self._in_flight.difference_update(alert[0] for alert in batch)
+            self.queue.task_done()
+
+    async def _send(self, user_id, text):
+        """Sends one message within the rate limits, waiting out any 429s."""
+        while True:
+            # The chat's slot is taken only now, and again after every 429
+            await self._wait_for_send_slot(user_id)
+            try:
+                await self.bot.send_message(chat_id=user_id, text=text, parse_mode='Markdown')
+                return
+            except RetryAfter as e:
+                # Telegram says we're over budget; stop everyone, not just this worker
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"Telegram rate limit hit, pausing alerts for {e.retry_after}s")
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import logging
+import time
+from urllib.parse import urlparse
+from config import SUPPORTED_DOMAINS, DOMAIN_RATE_LIMITS, DEFAULT_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Thread-safe token bucket with an optional minimum spacing between requests.
+
+    Callers reserve a slot up front and then sleep for the returned delay, which lets
+    the same bucket be shared by coroutines on different event loops and threads.
+    """
+
+    def __init__(self, rate, burst, min_interval=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_interval = min_interval
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Claims the next request slot and returns how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # may go negative: later callers queue up behind this one
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            start = max(now + wait, self.next_allowed)
+            self.next_allowed = start + self.min_interval
+            return start - now
+
+class DomainRateLimiter:
+    """Keeps one token bucket per supported retailer so each site is paced independently."""
+
+    def __init__(self, domains=SUPPORTED_DOMAINS, limits=DOMAIN_RATE_LIMITS, default=DEFAULT_RATE_LIMIT):
+        self.domains = domains
+        self.limits = limits
+        self.default = default
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def domain_of(self, url):
+        """Maps a URL to its retailer, matching the netloc the same way handle_url does."""
+        netloc = urlparse(url).netloc.lower()
+        return next((d for d in self.domains if d in netloc), netloc)
+
+    def _bucket(self, url):
+        key = self.domain_of(url)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst, min_interval = self.limits.get(key, self.default)
+                bucket = self._buckets[key] = TokenBucket(rate, burst, min_interval)
+            return bucket
+
+    async def wait_async(self, url):
+        """Suspends the calling coroutine until a request to the URL's domain is allowed."""
+        delay = self._bucket(url).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
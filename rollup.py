@@ -0,0 +1,50 @@
+import logging
+import time
+from config import (
+    HISTORY_RAW_DAYS, HISTORY_HOURLY_DAYS, HISTORY_RETENTION_DAYS,
+    HISTORY_ROLLUP_BATCH, HISTORY_ROLLUP_PAUSE
+)
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+class HistoryRollup:
+    """Downsamples and expires price history in small batches.
+
+    Raw points older than HISTORY_RAW_DAYS become hourly min/max/last buckets, hourly
+    buckets older than HISTORY_HOURLY_DAYS become daily ones, and daily buckets older
+    than HISTORY_RETENTION_DAYS (0 keeps them forever) are deleted. Each batch of
+    catalog products is its own short transaction, with a pause in between so the
+    SQLite write lock is never held for long.
+    """
+
+    def __init__(self, db, batch_size=HISTORY_ROLLUP_BATCH, pause=HISTORY_ROLLUP_PAUSE):
+        self.db = db
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def run(self):
+        """Runs one full compaction pass over the catalog. Blocking; call it off the event loop."""
+        started = time.monotonic()
+        now = int(time.time())
+        # Align cutoffs to bucket boundaries so a bucket is only ever rolled up once
+        raw_cutoff = (now - HISTORY_RAW_DAYS * DAY) // 3600 * 3600
+        hourly_cutoff = (now - HISTORY_HOURLY_DAYS * DAY) // DAY * DAY
+        retention_cutoff = now - HISTORY_RETENTION_DAYS * DAY if HISTORY_RETENTION_DAYS else None
+
+        batches = 0
+        last_id = 0
+        while True:
+            catalog_ids = self.db.get_catalog_ids_after(last_id, self.batch_size)
+            if not catalog_ids:
+                break
+            self.db.rollup_raw_history(catalog_ids, raw_cutoff)
+            self.db.rollup_hourly_history(catalog_ids, hourly_cutoff)
+            if retention_cutoff is not None:
+                self.db.purge_history(catalog_ids, retention_cutoff)
+            last_id = catalog_ids[-1]
+            batches += 1
+            time.sleep(self.pause)  # let the monitor and bot get at the write lock
+
+        logger.info(f"Price history rollup finished: {batches} batches in {time.monotonic() - started:.1f}s.")
@@ -3,97 +3,163 @@ import time
 import threading
 import logging
 import asyncio
+from collections import defaultdict
 from telegram import Bot
 from database import Database
 from scraper import ProductScraper
-from config import BOT_TOKEN, PRICE_ALERT_THRESHOLD, CHECK_INTERVAL
+from notifier import AlertSender, alert_reason
+from rollup import HistoryRollup
+from config import (
+    BOT_TOKEN, CHECK_INTERVAL, PRICE_FLUSH_BATCH, ALERT_DIGEST, ALERT_DIGEST_WINDOW,
+    HISTORY_ROLLUP_INTERVAL
+)
 
 logger = logging.getLogger(__name__)
 
 class PriceMonitor:
-    def __init__(self):
-        self.db = Database()
-        self.scraper = ProductScraper()
-        self.bot = Bot(token=BOT_TOKEN)
+    def __init__(self, db=None, scraper=None, flush_batch=PRICE_FLUSH_BATCH):
+        self.db = db or Database()
+        self.flush_batch = flush_batch
+        self.pending_prices = []
+        self.pending_alerts = []
+        self.pending_validators = []
+        self.sweep_id = None
+        self.scraper = scraper or ProductScraper()
+        self.alerts = AlertSender(Bot(token=BOT_TOKEN), self.db)
+        self.rollup = HistoryRollup(self.db)
+        self._rollup_task = None
         self.is_running = False
         self.thread = None
+        self.loop = None
+        self._check_task = None
 
-    def _check_prices(self):
+    async def _check_prices(self):
         """Scrapes and compares prices, prioritizing target price alerts."""
         logger.info("Scheduler running: Checking all product prices...")
-        products = self.db.get_all_products()
+        # SQLite calls run on worker threads so a busy database never stalls in-flight fetches
+        products = await asyncio.to_thread(self.db.get_all_products)
+        started = time.monotonic()
+        self.sweep_id = int(time.time())
+        self.alerts.sweep_running = True
+        try:
+            await self._check_products(products)
+        finally:
+            self.alerts.sweep_running = False
+            self.alerts.wake()
+        logger.info(f"Price check of {len(products)} products finished in {time.monotonic() - started:.1f}s.")
+
+    def _start_check(self):
+        """Scheduled job: starts a price check on the monitor's loop unless one is still running."""
+        if self._check_task and not self._check_task.done():
+            logger.warning("Previous price check is still running. Skipping this run.")
+            return
+        self._check_task = asyncio.get_running_loop().create_task(self._check_prices())
+
+    def _start_rollup(self):
+        """Scheduled job: compacts price history on a worker thread unless a rollup is still running."""
+        if self._rollup_task and not self._rollup_task.done():
+            logger.warning("Previous history rollup is still running. Skipping this run.")
+            return
+        self._rollup_task = asyncio.get_running_loop().create_task(asyncio.to_thread(self.rollup.run))
 
+    async def _check_products(self, products):
+        """Fetches each catalog product once and fans the result out to every subscriber."""
+        subscribers = defaultdict(list)
+        catalog_ids = {}
         for product in products:
-            product_id, user_id, url, title, last_price, target_price = product
-            
-            logger.info(f"Checking '{title[:30]}...' for user {user_id}")
-            product_info = self.scraper.get_product_info(url)
-            
-            if not product_info or not product_info.get('price'):
-                logger.warning(f"Could not get new price for {title}. Skipping.")
-                continue
-
-            current_price = product_info['price']
-            
-            if last_price is None or current_price == last_price:
-                self.db.update_product_price(product_id, current_price)
-                continue
-
-            alert_reason = None
-            # Priority 1: Check if price dropped below the user's target price
-            if target_price and current_price <= target_price:
-                alert_reason = f"dropped below your target of ₹{target_price:,.2f}"
-            
-            # Priority 2: If no target price, check for the general percentage drop
-            elif not target_price:
-                price_change_percent = ((current_price - last_price) / last_price) * 100
-                if abs(price_change_percent) >= PRICE_ALERT_THRESHOLD:
-                    change_type = "dropped" if price_change_percent < 0 else "increased"
-                    alert_reason = f"{change_type} by {abs(price_change_percent):.2f}%"
-
-            if alert_reason:
-                logger.info(f"Significant price change for {title}! Reason: {alert_reason}")
-                self._send_notification(user_id, title, url, last_price, current_price, alert_reason)
-            
-            # Always update the price in the database
-            self.db.update_product_price(product_id, current_price)
-
-
-    def _send_notification(self, user_id, title, url, old_price, new_price, reason):
-        """Sends a price alert notification to the user."""
-        emoji = "📉" if new_price < old_price else "📈"
-        
-        message = f"""
-{emoji} **Price Alert!** {emoji}
-
-**Product:** {title}
-The price has **{reason}**!
-
-**Old Price:** ₹{old_price:,.2f}
-**New Price:** ₹{new_price:,.2f}
-
-[View Product]({url})
-        """
+            subscribers[product[1]].append(product)
+            catalog_ids[product[3]] = product[1]
+
+        logger.info(f"Fetching {len(subscribers)} unique products for {len(products)} subscriptions.")
+        # One read for the whole sweep; changed validators are written with the prices
+        validators = await asyncio.to_thread(self.db.get_http_validators)
         try:
-            asyncio.run(self.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode='Markdown'
-            ))
-            logger.info(f"Notification sent to user {user_id} for '{title}'")
-        except Exception as e:
-            logger.error(f"Failed to send notification to user {user_id}: {e}")
+            async for url, product_info in self.scraper.get_many(list(catalog_ids), validators=validators):
+                catalog_id = catalog_ids[url]
+                if not product_info or not product_info.get('price'):
+                    logger.warning(f"Could not get new price for {url}. Skipping.")
+                    continue
+
+                current_price = product_info['price']
+                for product in subscribers[catalog_id]:
+                    self._evaluate_alert(product, current_price)
+                self._queue_validators(catalog_id, product_info, validators.get(url))
+
+                # One write per product, no matter how many users track it
+                await self._queue_price_update(catalog_id, current_price)
+        finally:
+            await self._flush_prices()
+
+    async def _queue_price_update(self, catalog_id, new_price):
+        """Buffers a price update and writes the buffer once it reaches the flush size."""
+        self.pending_prices.append((catalog_id, new_price))
+        if len(self.pending_prices) >= self.flush_batch:
+            await self._flush_prices()
+
+    def _queue_validators(self, catalog_id, product_info, cached):
+        """Buffers a page's HTTP validators for the next flush if they or the result changed."""
+        entry = (product_info.get('etag'), product_info.get('last_modified'), product_info['title'], product_info['price'])
+        if (entry[0] or entry[1]) and entry != cached:
+            self.pending_validators.append((catalog_id, *entry))
+
+    async def _flush_prices(self):
+        """Writes buffered price updates, their alerts and HTTP validators in one transaction, then wakes the sender."""
+        if self.pending_prices or self.pending_alerts or self.pending_validators:
+            updates, self.pending_prices = self.pending_prices, []
+            alerts, self.pending_alerts = self.pending_alerts, []
+            validators, self.pending_validators = self.pending_validators, []
+            # In digest mode alerts wait out the digest window so more can be merged into them
+            await asyncio.to_thread(
+                self.db.update_prices_bulk, updates, alerts,
+                deliver_after=ALERT_DIGEST_WINDOW if ALERT_DIGEST else 0, validators=validators
+            )
+            if alerts:
+                self.alerts.wake()
+
+    def _evaluate_alert(self, product, current_price):
+        """Compares a freshly scraped price against the stored one and alerts the subscriber if needed."""
+        subscription_id, catalog_id, user_id, url, title, last_price, target_price = product
+
+        if last_price is None or current_price == last_price:
+            return
+
+        reason = alert_reason(last_price, current_price, target_price)
+        if reason:
+            logger.info(f"Significant price change for {title}! Reason: {reason}")
+            # Same sweep + same price move = same key, so a retried flush can't duplicate it
+            idempotency_key = f"{self.sweep_id}:{subscription_id}:{last_price}:{current_price}"
+            self.pending_alerts.append(
+                (idempotency_key, user_id, subscription_id, catalog_id, last_price, current_price, reason)
+            )
 
     def _run_scheduler(self):
+        """Runs the monitor's long-lived event loop for the lifetime of the thread."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._run())
+        finally:
+            self.loop.close()
+        logger.info("Scheduler has stopped.")
+
+    async def _run(self):
         """Sets up and runs the scheduled job loop."""
-        schedule.every(CHECK_INTERVAL).minutes.do(self._check_prices)
+        # The bot client and scraper connections live as long as this loop,
+        # so they are reused across every alert and every sweep
+        await self.alerts.start()
+        schedule.every(CHECK_INTERVAL).minutes.do(self._start_check)
         logger.info(f"Scheduler configured to check prices every {CHECK_INTERVAL} minutes.")
-        
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(1)
-        
-        logger.info("Scheduler has stopped.")
+        schedule.every(HISTORY_ROLLUP_INTERVAL).hours.do(self._start_rollup)
+
+        try:
+            while self.is_running:
+                schedule.run_pending()
+                await asyncio.sleep(1)
+        finally:
+            if self._check_task and not self._check_task.done():
+                self._check_task.cancel()
+            await self.alerts.stop()
+            await self.scraper.aclose()
 
     def start_monitoring(self):
         """Starts the price monitoring in a separate thread."""
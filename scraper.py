@@ -1,12 +1,18 @@
-import requests
-from bs4 import BeautifulSoup
+import httpx
+import asyncio
 import logging
-import re
+from collections import defaultdict
+from sessions import SessionPool
+from ratelimit import DomainRateLimiter
+from extractors import get_extractor
+from structured import extract_structured_data
+from streaming import PageStream, charset_from_headers
+from config import SCRAPER_CONCURRENCY, STREAM_PAGES, STREAM_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
 class ProductScraper:
-    def __init__(self):
+    def __init__(self, concurrency=SCRAPER_CONCURRENCY, rate_limiter=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36',
             'Accept-Language': 'en-US,en;q=0.9',
@@ -15,57 +21,168 @@ class ProductScraper:
             'Connection': 'keep-alive',
             'DNT': '1'
         }
+        self.concurrency = concurrency
+        self.sessions = SessionPool(self.headers)
+        self.rate_limiter = rate_limiter or DomainRateLimiter()
 
-    def get_product_info(self, url):
+    async def fetch_product_info(self, url):
         """Fetches product information (title and price) from a given URL."""
-        try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'lxml')
+        await self.rate_limiter.wait_async(url)
+        return await self._fetch(url)
 
-            title = self._extract_title(soup)
-            price = self._extract_price(soup)
+    async def _fetch(self, url, cached=None):
+        """Downloads and parses a page; callers are responsible for rate limiting.
 
-            if title and price:
-                logger.info(f"Successfully scraped '{title}' with price {price} from {url}")
-                return {'title': title, 'price': price}
+        `cached` is the page's stored (etag, last_modified, title, price); when given,
+        the request is conditional and a 304 reuses the stored title and price. The
+        result carries the response's 'etag' and 'last_modified' for the caller to store.
+        """
+        try:
+            client = self.sessions.get_async_client(url)
+            cached = cached if self._usable(cached) else None
+            headers = self._conditional_headers(cached)
+            if not STREAM_PAGES:
+                response = await client.get(url, headers=headers)
+                if response.status_code == 304 and cached:
+                    return self._not_modified(cached, url)
+                response.raise_for_status()
+                # Parsing is CPU-bound, so keep it off the event loop
+                info = await asyncio.to_thread(self._parse_product, response.content, url)
             else:
-                logger.warning(f"Could not find title or price for URL: {url}")
-                return None
+                async with client.stream('GET', url, headers=headers) as response:
+                    if response.status_code == 304 and cached:
+                        return self._not_modified(cached, url)
+                    response.raise_for_status()
+                    stream = PageStream(get_extractor(url), charset_from_headers(response.headers))
+                    # Each chunk is small enough to parse inline; only the final full parse goes to a thread
+                    async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                        if stream.feed(chunk):
+                            break
+                info = await asyncio.to_thread(self._finish_stream, stream, url)
+            if info:
+                info['etag'] = response.headers.get('etag')
+                info['last_modified'] = response.headers.get('last-modified')
+            return info
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Request failed for URL {url}: {e}")
             return None
         except Exception as e:
             logger.error(f"An error occurred during scraping of {url}: {e}")
             return None
 
-    def _extract_title(self, soup):
-        """Extracts the product title using a list of potential selectors."""
-        title_selectors = [
-            '#productTitle', '.B_NuCI', '.pdp-title', '.product-title', 
-            'h1', 'span[data-ui="product-title"]'
-        ]
-        for selector in title_selectors:
-            element = soup.select_one(selector)
-            if element:
-                return element.get_text(strip=True)
-        return "Product Title Not Found"
-
-    def _extract_price(self, soup):
-        """Extracts and cleans the product price using a list of potential selectors."""
-        price_selectors = [
-            '.a-price-whole', '._30jeq3', '.pdp-price', '.product-price', 
-            '.a-offscreen', 'span.price', 'span[data-testid="price"]'
-        ]
-        for selector in price_selectors:
-            element = soup.select_one(selector)
-            if element:
-                price_text = element.get_text(strip=True)
-                cleaned_price = re.sub(r'[^\d.]', '', price_text)
-                if cleaned_price:
-                    try:
-                        return float(cleaned_price)
-                    except ValueError:
-                        continue
-        return None
+    async def resolve_url(self, url):
+        """Follows a share link's redirects and returns the final URL, or the input on failure."""
+        await self.rate_limiter.wait_async(url)
+        try:
+            # Stream so only the headers of the final page are read, not its body
+            async with self.sessions.get_async_client(url).stream('GET', url) as response:
+                return str(response.url)
+        except httpx.HTTPError as e:
+            logger.error(f"Could not resolve short link {url}: {e}")
+            return url
+
+    async def get_many(self, urls, concurrency=None, validators=None):
+        """Fetches many URLs concurrently, yielding (url, product_info) pairs as each one finishes.
+
+        `validators` maps URLs to their stored (etag, last_modified, title, price),
+        which makes those fetches conditional.
+
+        Each domain is fed by its own loop that reserves a rate-limit slot only when the
+        next fetch is about to start, so a sweep never holds more than one reservation
+        per domain. Interactive requests sharing the limiter therefore wait behind at most
+        one sweep fetch instead of the whole sweep.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+        validators = validators or {}
+        results = asyncio.Queue()
+        fetches = set()
+        by_domain = defaultdict(list)
+        for url in urls:
+            by_domain[self.rate_limiter.domain_of(url)].append(url)
+
+        async def fetch(url):
+            try:
+                results.put_nowait((url, await self._fetch(url, validators.get(url))))
+            finally:
+                semaphore.release()
+
+        async def feed(domain_urls):
+            for url in domain_urls:
+                # Take the concurrency slot first: waiting on it after reserving would
+                # let the reservation go stale while other domains hold every slot
+                await semaphore.acquire()
+                try:
+                    await self.rate_limiter.wait_async(url)
+                except BaseException:
+                    semaphore.release()
+                    raise
+                task = asyncio.create_task(fetch(url))
+                fetches.add(task)
+                task.add_done_callback(fetches.discard)
+
+        feeders = [asyncio.create_task(feed(domain_urls)) for domain_urls in by_domain.values()]
+        try:
+            for _ in range(len(urls)):
+                yield await results.get()
+        finally:
+            # If the consumer stops early, don't leave fetches running in the background
+            for task in [*feeders, *fetches]:
+                task.cancel()
+
+    async def aclose(self):
+        """Closes the pooled async connections opened on the running event loop."""
+        await self.sessions.aclose()
+
+    @staticmethod
+    def _usable(cached):
+        """A stored row without a title and price can't answer a 304, so don't ask for one."""
+        return bool(cached) and bool(cached[2]) and cached[3] is not None
+
+    def _conditional_headers(self, cached):
+        """Builds If-None-Match / If-Modified-Since headers from stored validators."""
+        if not cached:
+            return None
+        etag, last_modified = cached[0], cached[1]
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers or None
+
+    def _not_modified(self, cached, url):
+        """Answers a 304 with the title and price extracted when the page last changed."""
+        etag, last_modified, title, price = cached
+        logger.info(f"'{title}' unchanged at {url} (304), reusing price {price}")
+        return {'title': title, 'price': price, 'etag': etag, 'last_modified': last_modified}
+
+    def _finish_stream(self, stream, url):
+        """Extracts the result of a streamed download, logging how much of the page was read."""
+        title, price = stream.finish()
+        if title and price:
+            logger.info(f"Successfully scraped '{title}' with price {price} from {url} ({stream.bytes_read} bytes read)")
+            return {'title': title, 'price': price}
+        else:
+            logger.warning(f"Could not find title or price for URL: {url}")
+            return None
+
+    def _parse_product(self, content, url):
+        """Parses a downloaded page and returns its title and price, or None.
+
+        Structured data (JSON-LD, OpenGraph, microdata) is tried first because it needs
+        no tree; the site's CSS selectors only run when it is missing.
+        """
+        structured = extract_structured_data(content)
+        if structured:
+            logger.info(f"Successfully scraped '{structured['title']}' with price {structured['price']} from {url} (structured data)")
+            return structured
+
+        title, price = get_extractor(url).extract(content)
+
+        if title and price:
+            logger.info(f"Successfully scraped '{title}' with price {price} from {url}")
+            return {'title': title, 'price': price}
+        else:
+            logger.warning(f"Could not find title or price for URL: {url}")
+            return None
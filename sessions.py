@@ -0,0 +1,46 @@
+import httpx
+import asyncio
+import logging
+import weakref
+from urllib.parse import urlparse
+from config import SESSION_POOL_SIZE, SESSION_IDLE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class SessionPool:
+    """Keeps long-lived, per-domain HTTP sessions so repeat requests reuse TCP/TLS connections."""
+
+    def __init__(self, headers, pool_size=SESSION_POOL_SIZE, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.headers = headers
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        # httpx clients are bound to the event loop that first used them
+        self._async_clients = weakref.WeakKeyDictionary()  # loop -> {domain: httpx.AsyncClient}
+
+    @staticmethod
+    def _domain(url):
+        return urlparse(url).netloc.lower()
+
+    def get_async_client(self, url):
+        """Returns the pooled httpx.AsyncClient for the URL's domain on the running event loop."""
+        domain = self._domain(url)
+        clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(domain)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.idle_timeout,  # idle connections are reaped by httpx itself
+            )
+            # Requests queue for a free pooled connection instead of failing with PoolTimeout
+            timeout = httpx.Timeout(15, pool=None)
+            client = clients[domain] = httpx.AsyncClient(
+                headers=self.headers, limits=limits, timeout=timeout, follow_redirects=True
+            )
+        return client
+
+    async def aclose(self):
+        """Closes the async clients that belong to the running event loop."""
+        clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
@@ -0,0 +1,95 @@
+import re
+from lxml import etree
+from structured import StructuredDataScanner
+from config import STREAM_MAX_BYTES
+
+# How far before a chunk to look for a selector's name, for start tags split across chunks
+NEEDLE_LOOKBEHIND = 1024
+
+CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+
+def charset_from_headers(headers):
+    """Returns the charset declared in Content-Type, or None so the parser sniffs the page itself."""
+    match = CHARSET_RE.search(headers.get('content-type', ''))
+    return match.group(1) if match else None
+
+class PageStream:
+    """Parses a product page chunk by chunk while it downloads.
+
+    `feed` returns True as soon as reading further is pointless: structured data
+    was found, the top-priority selectors matched on the partial tree, or the byte
+    cap was hit. Only the lxml backend builds a tree incrementally; soup-backend
+    sites can still stop early on structured data and are parsed in full at `finish`.
+    """
+
+    def __init__(self, extractor, encoding=None, max_bytes=STREAM_MAX_BYTES):
+        self.extractor = extractor
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.structured = StructuredDataScanner()
+        self.result = None
+        self.parser = None
+        self.root = None
+        self.title_element = None
+        self.price_element = None
+        if extractor.backend == 'lxml':
+            # The only event needed is the root element, to query the tree as it grows
+            self.parser = etree.HTMLPullParser(events=('start',), tag='html', encoding=encoding)
+
+    def feed(self, chunk):
+        """Adds a downloaded chunk; returns True once the connection can be closed.
+
+        Work per chunk is proportional to the chunk, not to everything read so far,
+        except for the tree queries run when a chunk mentions a selector's name.
+        """
+        chunk = chunk[:self.max_bytes - len(self.buffer)]
+        self.buffer += chunk
+
+        structured = self.structured.feed(self.buffer)
+        if structured:
+            self.result = structured
+            return True
+
+        if self.parser is not None and chunk:
+            self.parser.feed(chunk)
+            for _, element in self.parser.read_events():
+                self.root = element
+            if self.root is not None:
+                # Query the tree only when the chunk's raw bytes mention a selector at all,
+                # so most chunks cost no more than parsing them
+                window = bytes(self.buffer[max(0, len(self.buffer) - len(chunk) - NEEDLE_LOOKBEHIND):])
+                if self.title_element is None and self._may_match(self.extractor.primary_title_needle, window):
+                    self.title_element = self._first(self.extractor.xpath_title_selectors)
+                if self.price_element is None and self._may_match(self.extractor.primary_price_needle, window):
+                    self.price_element = self._first(self.extractor.xpath_price_selectors)
+            if self.title_element is not None and self.price_element is not None:
+                found = self.extractor.extract_primary_lxml(self.title_element, self.price_element)
+                if found:
+                    self.result = {'title': found[0], 'price': found[1]}
+                    return True
+
+        return len(self.buffer) >= self.max_bytes
+
+    @staticmethod
+    def _may_match(needle, window):
+        return needle is None or needle in window
+
+    def _first(self, selectors):
+        """Returns the first element the top-priority selector matches in the tree so far, or None."""
+        if not selectors:
+            return None
+        matches = selectors[0](self.root)
+        return matches[0] if matches else None
+
+    def finish(self):
+        """Returns (title, price) from what was read, falling back to the site's full selector list."""
+        if self.result:
+            return self.result['title'], self.result['price']
+        if self.parser is not None:
+            root = self.parser.close()
+            return self.extractor.extract_title_lxml(root), self.extractor.extract_price_lxml(root)
+        return self.extractor.extract(bytes(self.buffer))
+
+    @property
+    def bytes_read(self):
+        return len(self.buffer)
@@ -0,0 +1,145 @@
+import html
+import json
+import re
+from extractors import parse_price
+
+# Only the snippets that carry structured product data are scanned; the rest of
+# the page is never tokenized or turned into a tree.
+JSON_LD_RE = re.compile(
+    rb'<script[^>]*type\s*=\s*["\']application/ld\+json["\'][^>]*>(.*?)</script\s*>', re.I | re.S
+)
+META_TAG_RE = re.compile(rb'<meta\s[^>]*>', re.I)
+PRICE_TAG_RE = re.compile(rb'<[a-z]+\s[^>]*itemprop\s*=\s*["\']price["\'][^>]*>', re.I)
+SCRIPT_OPEN_RE = re.compile(rb'<script\b', re.I)
+SCRIPT_CLOSE_RE = re.compile(rb'</script\s*>', re.I)
+ATTR_RE = re.compile(rb'([a-z:_-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.I)
+
+PRICE_META_KEYS = (b'og:price:amount', b'product:price:amount', b'product:price', b'price')
+TITLE_META_KEYS = (b'og:title', b'twitter:title')
+
+def _attrs(tag):
+    """Returns a tag's attributes as a dict with lowercased byte-string names."""
+    return {m.group(1).lower(): m.group(2) if m.group(2) is not None else m.group(3) for m in ATTR_RE.finditer(tag)}
+
+def _text(value):
+    return html.unescape(value.decode('utf-8', errors='replace')).strip()
+
+def _iter_nodes(data):
+    """Walks JSON-LD, descending into lists and @graph containers."""
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        if '@graph' in data:
+            yield from _iter_nodes(data['@graph'])
+
+def _is_product(node):
+    node_type = node.get('@type')
+    types = node_type if isinstance(node_type, list) else [node_type]
+    return 'Product' in types
+
+def _offer_price(offers):
+    """Pulls a price out of an Offer, AggregateOffer or a list of them."""
+    for offer in offers if isinstance(offers, list) else [offers]:
+        if not isinstance(offer, dict):
+            continue
+        for key in ('price', 'lowPrice'):
+            if offer.get(key) not in (None, ''):
+                price = parse_price(str(offer[key]))
+                if price is not None:
+                    return price
+        if 'priceSpecification' in offer:
+            price = _offer_price(offer['priceSpecification'])
+            if price is not None:
+                return price
+    return None
+
+def _from_json_ld(content):
+    for match in JSON_LD_RE.finditer(content):
+        try:
+            data = json.loads(match.group(1).decode('utf-8', errors='replace'))
+        except ValueError:
+            continue
+        for node in _iter_nodes(data):
+            if _is_product(node):
+                price = _offer_price(node.get('offers'))
+                if price is not None:
+                    return {'title': html.unescape(str(node.get('name') or '')).strip() or None, 'price': price}
+    return None
+
+def _from_meta_tags(content):
+    title = price = None
+    for match in META_TAG_RE.finditer(content):
+        attrs = _attrs(match.group(0))
+        key = (attrs.get(b'property') or attrs.get(b'name') or attrs.get(b'itemprop') or b'').lower()
+        value = attrs.get(b'content')
+        if value is None:
+            continue
+        if price is None and key in PRICE_META_KEYS:
+            price = parse_price(_text(value))
+        elif title is None and key in TITLE_META_KEYS:
+            title = _text(value) or None
+    if price is None:
+        # Microdata on a non-meta element, e.g. <span itemprop="price" content="1299">
+        for match in PRICE_TAG_RE.finditer(content):
+            value = _attrs(match.group(0)).get(b'content')
+            if value:
+                price = parse_price(_text(value))
+                if price is not None:
+                    break
+    return {'title': title, 'price': price}
+
+def _combine(json_ld, meta):
+    """Prefers the JSON-LD product, filling a missing title or price from meta tags."""
+    result = json_ld or {'title': None, 'price': None}
+    title = result['title'] or meta['title']
+    price = result['price'] if result['price'] is not None else meta['price']
+    if title and price:
+        return {'title': title, 'price': price}
+    return None
+
+def extract_structured_data(content):
+    """Fast path: reads title and price from JSON-LD, OpenGraph/product meta tags or microdata.
+
+    Returns {'title', 'price'} when both were found, otherwise None so the caller can
+    fall back to the full HTML parse.
+    """
+    result = _from_json_ld(content)
+    if result and result['title'] and result['price'] is not None:
+        return result
+    return _combine(result, _from_meta_tags(content))
+
+class StructuredDataScanner:
+    """extract_structured_data for a page that arrives in chunks.
+
+    Each `feed` only scans bytes that arrived since the previous one. It stops
+    short of a tag or script that isn't complete yet, so that part is scanned
+    again once the rest has arrived.
+    """
+
+    def __init__(self):
+        self.scanned = 0
+        self.json_ld = None
+        self.meta = {'title': None, 'price': None}
+
+    def feed(self, buffer):
+        """Scans the new part of `buffer` (everything received so far); returns the result once known."""
+        end = buffer.rfind(b'>') + 1
+        last_script = None
+        for last_script in SCRIPT_OPEN_RE.finditer(buffer, self.scanned, end):
+            pass
+        if last_script and not SCRIPT_CLOSE_RE.search(buffer, last_script.start()):
+            end = last_script.start()
+        if end <= self.scanned:
+            return None
+
+        region = bytes(buffer[self.scanned:end])
+        self.scanned = end
+        if self.json_ld is None:
+            self.json_ld = _from_json_ld(region)
+        meta = _from_meta_tags(region)
+        for key in ('title', 'price'):
+            if self.meta[key] is None:
+                self.meta[key] = meta[key]
+        return _combine(self.json_ld, self.meta)